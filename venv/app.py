@@ -0,0 +1,227 @@
+# app.py
+# Application factory: configuration, extensions, blueprints and CLI commands
+# Routes live in the views package (households, payments, imports, ocr); run with `flask --app app run`
+# or serve wsgi:app from a pre-forking server (see wsgi.py)
+
+import os
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from dotenv import load_dotenv
+from models import db, Household, Payment # Import db and models from models.py
+from ocr import OcrJobQueue, OcrResultCache, find_tesseract # Background OCR workers, result cache and Tesseract discovery
+from chat_import import ReceiptBatchJobs # Background OCR of "export with media" ZIPs
+from helpers import ALLOWED_EXTENSIONS_IMG
+from bulk_io import read_rows, import_rows, iter_payments_csv, parse_period # Bulk CSV/XLSX import and CSV export
+from late_rules import LATE_MODES, LATE_MODE_CUTOFF_DAY, load_late_rules, set_late_rule, recompute_late_flags # Late-payment rules and re-flagging
+from instrumentation import init_metrics # Opt-in request timing / SQL counting
+from synthetic import generate_society, write_chat_export # Synthetic data for benchmarks
+from rollups import init_rollups, rebuild_rollups # Reporting tables
+from views import BLUEPRINTS
+
+# Heavy libraries (pytesseract, Pillow, dateutil, openpyxl) are not imported here: the modules
+# that need them import them on first use, which keeps start-up and per-worker memory small.
+
+
+def create_app(config=None):
+    """
+    Creates and configures the Flask application. `config` (a dict) overrides the settings
+    read from the environment / .env file. Nothing here touches the database, spawns OCR
+    workers or writes to disk, so the app can be created once and forked (gunicorn --preload).
+    Returns: Flask app
+    """
+    # Load environment variables from .env file
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default-fallback-secret-key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///instance/maintenance.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes') # Per-request timing and /_metrics
+    app.config['TESSERACT_CMD'] = os.environ.get('TESSERACT_CMD') # Explicit Tesseract path; found on the PATH otherwise
+    app.config['OCR_CACHE_DIR'] = os.environ.get('OCR_CACHE_DIR', os.path.join(app.instance_path, 'ocr_cache'))
+    app.config['RECEIPT_BATCH_DIR'] = os.environ.get('RECEIPT_BATCH_DIR', os.path.join(app.instance_path, 'receipt_batches'))
+    app.config['OCR_WORKERS'] = int(os.environ['OCR_WORKERS']) if os.environ.get('OCR_WORKERS') else None
+    if config:
+        app.config.update(config)
+
+    # Initialize SQLAlchemy with the Flask app
+    db.init_app(app)
+    # Keep the reporting rollups in step with every Payment change flushed through the session
+    init_rollups(db.session)
+    # Record wall time and SQL statements per request (only when METRICS_ENABLED is set)
+    init_metrics(app)
+
+    # --- Tesseract ---
+    # Resolved once at start-up (configured path, then PATH, then the usual install locations)
+    # and handed to the OCR workers; pytesseract itself is only imported by the workers
+    tesseract_cmd = find_tesseract(app.config['TESSERACT_CMD'])
+    if tesseract_cmd is None:
+        app.logger.warning("Tesseract executable not found - receipt OCR is unavailable. Install Tesseract or set TESSERACT_CMD.")
+    app.config['TESSERACT_CMD'] = tesseract_cmd
+
+    # OCR runs on a background process pool (started on first use); results are cached by image hash
+    app.extensions['ocr_queue'] = OcrJobQueue(
+        OcrResultCache(app.config['OCR_CACHE_DIR']),
+        max_workers=app.config['OCR_WORKERS'],
+        tesseract_cmd=tesseract_cmd
+    )
+    # Uploaded ZIPs are OCR'd on a background thread; the review page polls for the proposals
+    app.extensions['receipt_batches'] = ReceiptBatchJobs(app.config['RECEIPT_BATCH_DIR'], app.extensions['ocr_queue'], ALLOWED_EXTENSIONS_IMG)
+
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+    for command in CLI_COMMANDS:
+        app.cli.add_command(command)
+    return app
+
+
+# --- Custom CLI Commands ---
+@click.command("db-init")
+@with_appcontext
+def db_init():
+    """Initializes the database and creates tables."""
+    try:
+        instance_path = os.path.join(current_app.root_path, 'instance')
+        os.makedirs(instance_path, exist_ok=True)
+        print("Creating database tables...")
+        # Drop existing tables (Use with caution - DEVELOPMENT ONLY)
+        # db.drop_all()
+        # print("Existing tables dropped.")
+        db.create_all()
+        # create_all() skips tables that already exist, so add indexes introduced later explicitly
+        for index in Payment.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        rebuild_rollups(db.session.connection())
+        db.session.commit()
+        print("Database tables created successfully.")
+        print(f"Database file located at: {current_app.config['SQLALCHEMY_DATABASE_URI']}")
+    except Exception as e:
+        print(f"Error initializing database: {e}")
+
+
+@click.command("import-data")
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def import_data_command(path):
+    """Bulk imports households and payments from a CSV/XLSX file (same format as the web upload)."""
+    with open(path, 'rb') as f:
+        try:
+            result = import_rows(read_rows(f, path), load_late_rules().is_late)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error importing {path}: {e}")
+            return
+    if result.errors:
+        print(f"No changes saved - {len(result.errors)} problems found:")
+        for error in result.errors:
+            print(f"  {error}")
+        return
+    print(f"Imported {result.rows_read} rows: {result.households_created} households added, {result.households_updated} updated; "
+          f"{result.payments_created} payment records added, {result.payments_updated} updated.")
+
+
+@click.command("export-payments")
+@click.argument('start')
+@click.argument('end')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help="CSV file to write (default: stdout)")
+@with_appcontext
+def export_payments_command(start, end, output):
+    """Exports payment records from START to END (YYYY-MM, inclusive) as CSV."""
+    try:
+        start, end = parse_period(start), parse_period(end)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    out = open(output, 'w', encoding='utf-8', newline='') if output else click.get_text_stream('stdout')
+    try:
+        for chunk in iter_payments_csv(start, end):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@click.command("late-rule-set")
+@click.option('--wing', default=None, help="Wing the rule applies to (default: whole society)")
+@click.option('--cutoff-day', type=int, required=True, help="Payments after this day of the month are late")
+@click.option('--grace-days', type=int, default=0, show_default=True, help="Extra days allowed after the cut-off")
+@click.option('--holiday-shift/--no-holiday-shift', default=False, help="Move deadlines on Sundays/holidays to the next working day")
+@click.option('--mode', type=click.Choice(list(LATE_MODES)), default=LATE_MODE_CUTOFF_DAY, show_default=True,
+              help="cutoff_day: late when paid after the cut-off day of the bill's month or a later month; deadline: late any time after the bill month's deadline")
+@with_appcontext
+def late_rule_set(wing, cutoff_day, grace_days, holiday_shift, mode):
+    """Saves a late-payment rule and re-flags all payment history."""
+    try:
+        set_late_rule(wing, cutoff_day, grace_days, holiday_shift, mode)
+        db.session.flush()
+        changed = recompute_late_flags()
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        raise click.BadParameter(str(e))
+    print(f"Rule saved. Late flags recomputed: {changed} payment records changed.")
+
+
+@click.command("recompute-late")
+@click.option('--from-year', type=int, default=None, help="First payment year to re-flag (default: earliest)")
+@click.option('--to-year', type=int, default=None, help="Last payment year to re-flag (default: latest)")
+@with_appcontext
+def recompute_late(from_year, to_year):
+    """Re-evaluates is_late for all payments in a year range against the saved late-payment rules."""
+    try:
+        changed = recompute_late_flags(from_year, to_year)
+        db.session.commit()
+        print(f"Late flags recomputed: {changed} payment records changed.")
+    except Exception as e:
+        print(f"Error recomputing late flags: {e}")
+
+
+@click.command("seed-synthetic")
+@click.option('--wings', type=int, default=4, show_default=True)
+@click.option('--flats', type=int, default=50, show_default=True, help="Flats per wing")
+@click.option('--years', type=int, default=3, show_default=True, help="Years of payment history")
+@click.option('--seed', type=int, default=0, show_default=True)
+@with_appcontext
+def seed_synthetic(wings, flats, years, seed):
+    """Fills an empty database with a synthetic society and its payment history (for benchmarks)."""
+    db.create_all()
+    if db.session.scalar(db.select(db.func.count(Household.id))):
+        print("Database already has households - use an empty database (DATABASE_URL) for synthetic data.")
+        return
+    households, payments = generate_society(wings, flats, years, seed=seed)
+    print(f"Created {households} households and {payments} payment records.")
+
+
+@click.command("generate-chat")
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('--messages', type=int, default=10000, show_default=True)
+@click.option('--wings', type=int, default=4, show_default=True)
+@click.option('--flats', type=int, default=50, show_default=True, help="Flats per wing")
+@click.option('--seed', type=int, default=0, show_default=True)
+def generate_chat(path, messages, wings, flats, seed):
+    """Writes a synthetic WhatsApp chat export (.txt) with receipt messages for the synthetic society."""
+    lines = write_chat_export(path, messages, wings, flats, seed=seed)
+    print(f"Wrote {messages} messages ({lines} lines) to {path}.")
+
+
+@click.command("rollups-rebuild")
+@with_appcontext
+def rollups_rebuild():
+    """Recomputes the reporting rollup tables from all payment records."""
+    try:
+        rebuild_rollups(db.session.connection())
+        db.session.commit()
+        print("Reporting rollups rebuilt.")
+    except Exception as e:
+        print(f"Error rebuilding rollups: {e}")
+
+
+CLI_COMMANDS = (
+    db_init, import_data_command, export_payments_command, late_rule_set, recompute_late,
+    seed_synthetic, generate_chat, rollups_rebuild
+)
+
+
+# --- Main Execution ---
+if __name__ == '__main__':
+    create_app().run(debug=True) # Keep debug=True for development
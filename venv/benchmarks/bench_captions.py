@@ -0,0 +1,149 @@
+# bench_captions.py
+# Micro-benchmark and golden-corpus check for parse_flat_wing_from_caption
+# Usage (from the app folder): python benchmarks/bench_captions.py [--rounds N]
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Make the app modules importable
+from chat_parser import parse_flat_wing_from_caption, _caption_primary, _caption_alternatives
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'caption_corpus.json')
+
+
+# --- Previous implementation (up to eight re.search calls per caption), kept as the "before" baseline ---
+def legacy_parse_flat_wing_from_caption(caption):
+    """
+    Attempts to extract flat number and wing from caption text using regex.
+    !! This function will likely need significant adjustment based on actual caption formats !!
+    Returns: tuple (flat_number, wing) or (None, None)
+    """
+    flat_number = None
+    wing = None
+    # Handle potential None caption
+    if caption is None:
+        return None, None
+    caption_lower = caption.lower()
+
+    # --- Regex Patterns (Examples - Adjust based on your group's usage) ---
+    # Pattern 1: "Flat A-101", "Flat: 101", "Flat No 101" (captures number/alphanumeric after "flat")
+    match_flat = re.search(r'flat\s*(?:no\.?|number|[:\-])?\s*([\w\d\-]+)', caption_lower)
+    # Pattern 2: "Wing C", "Wing: A" (captures single letter/word after "wing")
+    match_wing = re.search(r'wing\s*[:\-]?\s*([a-zA-Z]+)', caption_lower)
+     # Pattern 3: Combined like "A-101", "C 203", "D601" (assumes Wing is letter, Flat is number)
+     # Updated to handle wing/flat without separator and optional leading text
+    match_combined = re.search(r'(?:^|\s)([a-zA-Z])\s*[\-]?\s*(\d+)', caption) # Wing-Flat or Wing Flat
+    match_combined_no_sep = re.search(r'(?:^|\s)([a-zA-Z])(\d{3})(?:\s|$)', caption) # WingFlat (e.g., D601) - assumes 3 digits for flat
+
+    if match_flat:
+        flat_number = match_flat.group(1).upper().replace('-', '') # Extract first capture group, remove hyphens
+    if match_wing:
+        wing = match_wing.group(1).upper() # Extract first capture group
+
+    # If wing/flat not found individually, check combined patterns
+    if not flat_number and not wing:
+         if match_combined:
+             wing = match_combined.group(1).upper()
+             flat_number = match_combined.group(2)
+         elif match_combined_no_sep:
+             wing = match_combined_no_sep.group(1).upper()
+             flat_number = match_combined_no_sep.group(2)
+
+
+    # Basic validation/cleanup (optional)
+    # if flat_number and not flat_number.isalnum(): flat_number = None # Allow digits only maybe?
+    # if wing and not wing.isalpha(): wing = None # Ensure alphabetic
+
+    # If only flat number found, try common single-letter wing pattern like "A 101" or "C-101" before number
+    if flat_number and not wing:
+        # Look for Wing<separator>Flat
+        match_wing_first = re.search(r'([a-zA-Z])\s*[\-]?\s*' + re.escape(flat_number), caption)
+        if match_wing_first:
+            wing = match_wing_first.group(1).upper()
+
+    # If only wing found, try finding number after wing "Wing A 101"
+    if wing and not flat_number:
+        match_flat_after = re.search(re.escape(wing) + r'\s+[\-]?\s*(\d+)', caption, re.IGNORECASE)
+        if match_flat_after:
+            flat_number = match_flat_after.group(1)
+
+    # --- Add more specific patterns as needed based on your data ---
+    # Example: If people write "Payment for 101 B"
+    match_payment_for = re.search(r'payment\s+for\s+(\d+)\s+([a-zA-Z])', caption_lower)
+    if not flat_number and match_payment_for:
+        flat_number = match_payment_for.group(1)
+        wing = match_payment_for.group(2).upper()
+
+    # Example: Just "C201"
+    match_simple_wing_flat = re.search(r'(?:^|\s)([a-zA-Z])(\d{3})(?:\s|$|\W)', caption) # Wing + 3 digits
+    if not flat_number and not wing and match_simple_wing_flat:
+         wing = match_simple_wing_flat.group(1).upper()
+         flat_number = match_simple_wing_flat.group(2)
+
+
+    # Return extracted values (could be None)
+    return flat_number, wing
+
+def load_corpus():
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    known_households = {(flat, wing) for wing in corpus['wings'] for flat in corpus['flats']}
+    return corpus['captions'], known_households
+
+
+def check_corpus(entries, known_households):
+    """Returns the corpus entries the current parser gets wrong."""
+    failures = []
+    for entry in entries:
+        result = parse_flat_wing_from_caption(entry['caption'], known_households)
+        if result != (entry['flat'], entry['wing']):
+            failures.append((entry, result))
+    return failures
+
+
+def captions_per_second(func, captions, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for caption in captions:
+            func(caption)
+    return len(captions) * rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caption parser golden-corpus check and micro-benchmark")
+    parser.add_argument('--rounds', type=int, default=2000, help="Passes over the corpus per measurement")
+    args = parser.parse_args()
+
+    entries, known_households = load_corpus()
+    captions = [entry['caption'] for entry in entries]
+
+    failures = check_corpus(entries, known_households)
+    legacy_correct = sum(
+        legacy_parse_flat_wing_from_caption(entry['caption']) == (entry['flat'], entry['wing']) for entry in entries
+    )
+    print(f"Golden corpus: {len(entries) - len(failures)}/{len(entries)} correct (previous parser: {legacy_correct}/{len(entries)})")
+    for entry, result in failures:
+        print(f"  MISMATCH {entry['caption']!r}: expected ({entry['flat']}, {entry['wing']}), got {result}")
+
+    def uncached(caption):
+        _caption_primary.cache_clear()
+        _caption_alternatives.cache_clear()
+        return parse_flat_wing_from_caption(caption, known_households)
+
+    results = [
+        ("before (re.search per pattern)", captions_per_second(legacy_parse_flat_wing_from_caption, captions, args.rounds)),
+        ("after, cold cache", captions_per_second(uncached, captions, args.rounds)),
+        ("after, memoized", captions_per_second(lambda c: parse_flat_wing_from_caption(c, known_households), captions, args.rounds)),
+    ]
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f"{name:32} {rate:12,.0f} captions/s  ({rate / baseline:.1f}x)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# bench_routes.py
+# Route benchmark: builds a synthetic society in an on-disk SQLite database and drives the main routes
+# through the Flask test client, reporting wall time and SQL statements per request (SQL figures come from
+# /_metrics, which also covers queries run while a streamed response is being sent)
+# Usage (from the app folder): python benchmarks/bench_routes.py [--wings 4 --flats 50 --years 3 --messages 5000 --rounds 5]
+# Exits 1 if any route runs more SQL statements than its budget (catches per-row query regressions)
+
+import os
+import io
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR) # Make the app modules importable
+
+# SQL statements allowed per request - independent of the number of households/years by design
+ROUTE_SQL_BUDGETS = {
+    'index (new month)': 12,
+    'index': 8,
+    'matrix (12 months)': 6,
+    'arrears report': 6,
+    'defaulters report': 6,
+    'record_payment GET': 8,
+    'record_payment POST': 20,
+    'upload_chat (first)': 40,
+    'upload_chat (re-upload)': 10,
+    'upload_receipt': 6,
+    'export_payments': 4,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the main routes against a synthetic society")
+    parser.add_argument('--wings', type=int, default=4)
+    parser.add_argument('--flats', type=int, default=50, help="Flats per wing")
+    parser.add_argument('--years', type=int, default=3, help="Years of payment history")
+    parser.add_argument('--messages', type=int, default=5000, help="Messages in the generated chat export")
+    parser.add_argument('--rounds', type=int, default=5, help="Requests per route")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-dir', default=None, help="Directory for the SQLite database (default: a temporary directory)")
+    return parser.parse_args()
+
+
+def timed_request(client, method, url, **kwargs):
+    """Returns: (response, client wall ms)"""
+    start = time.perf_counter()
+    response = client.open(url, method=method, **kwargs)
+    response.get_data() # Consume streamed bodies too
+    response.close() # Streamed responses record their metrics on close
+    return response, (time.perf_counter() - start) * 1000
+
+
+def server_metrics(client):
+    """Returns: (max SQL statements per request, average SQL ms) recorded on /_metrics since the last reset."""
+    rows = client.get('/_metrics?format=json').get_json()
+    if not rows:
+        return 0, 0.0
+    return max(row['sql_max'] for row in rows), sum(row['sql_time_total'] for row in rows) * 1000 / sum(row['requests'] for row in rows)
+
+
+def receipt_image(rng):
+    """A small random PNG (a new image each time, so the OCR cache never answers)."""
+    from PIL import Image
+    img = Image.new('L', (200, 80), 255)
+    img.putdata([255 if rng.random() < 0.9 else 0 for _ in range(200 * 80)])
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    args = parse_args()
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix='bench_routes_')
+    os.makedirs(db_dir, exist_ok=True)
+    db_path = os.path.join(db_dir, 'bench.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    import datetime
+    from app import create_app
+    from models import db, Household
+    from synthetic import generate_society, write_chat_export
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}",
+        'METRICS_ENABLED': True,
+        'OCR_CACHE_DIR': os.path.join(db_dir, 'ocr_cache'),
+    })
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        households, payments = generate_society(args.wings, args.flats, args.years, seed=args.seed)
+        print(f"Synthetic society: {households} households, {payments} payment records "
+              f"({time.perf_counter() - start:.1f}s) in {db_path}")
+        household_ids = db.session.scalars(db.select(Household.id)).all()
+
+    chat_path = os.path.join(db_dir, 'chat.txt')
+    lines = write_chat_export(chat_path, args.messages, args.wings, args.flats, seed=args.seed)
+    with open(chat_path, 'rb') as f:
+        chat_bytes = f.read()
+    print(f"Chat export: {args.messages} messages, {lines} lines, {len(chat_bytes) / 1024:.0f} KiB")
+
+    today = datetime.date.today()
+    last_year = today.year - 1
+    scenarios = [
+        # (name, rounds, method, url factory, request kwargs factory)
+        ('index (new month)', 1, 'GET', lambda i: f'/?month={today.month}&year={today.year}', None),
+        ('index', args.rounds, 'GET', lambda i: f'/?month={i % 12 + 1}&year={last_year}', None),
+        ('matrix (12 months)', args.rounds, 'GET', lambda i: f'/matrix?month=12&year={last_year}&span=12', None),
+        ('arrears report', args.rounds, 'GET', lambda i: f'/reports/arrears?month=12&year={last_year}&months=36', None),
+        ('defaulters report', args.rounds, 'GET', lambda i: '/reports/defaulters?min_months=2', None),
+        ('record_payment GET', args.rounds, 'GET', lambda i: f'/record_payment/{rng.choice(household_ids)}/{last_year}/{i % 12 + 1}', None),
+        ('record_payment POST', args.rounds, 'POST', lambda i: f'/record_payment/{rng.choice(household_ids)}/{last_year}/{i % 12 + 1}',
+         lambda i: {'data': {'amount_paid': '1500', 'payment_date': f'{last_year}-{i % 12 + 1:02d}-25', 'status': 'Paid'}}),
+        ('upload_chat (first)', 1, 'POST', lambda i: '/upload_chat',
+         lambda i: {'data': {'chatfile': (io.BytesIO(chat_bytes), 'chat.txt')}, 'content_type': 'multipart/form-data'}),
+        ('upload_chat (re-upload)', 1, 'POST', lambda i: '/upload_chat',
+         lambda i: {'data': {'chatfile': (io.BytesIO(chat_bytes), 'chat.txt')}, 'content_type': 'multipart/form-data'}),
+        ('upload_receipt', args.rounds, 'POST', lambda i: f'/upload_receipt/{rng.choice(household_ids)}/{last_year}/{i % 12 + 1}',
+         lambda i: {'data': {'receipt_image': (io.BytesIO(receipt_image(rng)), 'receipt.png')}, 'content_type': 'multipart/form-data'}),
+        ('export_payments', 1, 'GET', lambda i: f'/export_payments?start={last_year - args.years + 1}-01&end={last_year}-12', None),
+    ]
+
+    print(f"\n{'route':26} {'runs':>4} {'median ms':>10} {'max ms':>9} {'SQL/req':>8} {'SQL ms':>8} {'budget':>7}")
+    over_budget = []
+    for name, rounds, method, url_for_round, kwargs_for_round in scenarios:
+        client.get('/_metrics?reset=1&format=json')
+        walls = []
+        for i in range(rounds):
+            response, wall_ms = timed_request(
+                client, method, url_for_round(i), **(kwargs_for_round(i) if kwargs_for_round else {})
+            )
+            if response.status_code >= 400:
+                print(f"  {name}: HTTP {response.status_code}")
+            walls.append(wall_ms)
+        sql_max, sql_ms = server_metrics(client)
+        budget = ROUTE_SQL_BUDGETS.get(name)
+        flag = ''
+        if budget is not None and sql_max > budget:
+            over_budget.append(name)
+            flag = '  OVER BUDGET'
+        print(f"{name:26} {rounds:>4} {statistics.median(walls):>10.1f} {max(walls):>9.1f} {sql_max:>8} "
+              f"{sql_ms:>8.1f} {budget if budget is not None else '-':>7}{flag}")
+
+    if not args.db_dir:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    if over_budget:
+        print(f"\nSQL budget exceeded by: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
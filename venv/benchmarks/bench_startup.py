@@ -0,0 +1,103 @@
+# bench_startup.py
+# Start-up benchmark: times `import app` and create_app() in fresh interpreters (what every worker,
+# CLI command and reload pays) and checks that the heavy optional libraries stay unloaded
+# Usage (from the app folder): python benchmarks/bench_startup.py [--runs 7 --top 10]
+# Exits 1 if a library that should load lazily is imported at start-up
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once OCR, a fallback timestamp or an .xlsx upload is actually processed
+LAZY_MODULES = ('pytesseract', 'PIL', 'dateutil', 'openpyxl')
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'modules': len(sys.modules),
+    'lazy_loaded': [name for name in LAZY_MODULES if name in sys.modules],
+}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure app import and create_app() time in fresh interpreters")
+    parser.add_argument('--runs', type=int, default=7, help="Fresh interpreters to start")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to list (from -X importtime), 0 to skip")
+    return parser.parse_args()
+
+
+def child_env():
+    env = dict(os.environ)
+    # In-memory database and no .env surprises: the probe must not write anything
+    env['DATABASE_URL'] = 'sqlite:///:memory:'
+    env.pop('METRICS_ENABLED', None)
+    return env
+
+
+def run_probe():
+    """Returns: the probe's result dict for one fresh interpreter."""
+    code = f"LAZY_MODULES = {LAZY_MODULES!r}\n{PROBE}"
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=APP_DIR, env=child_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """Returns: [(cumulative ms, module)] for the `top` slowest modules imported directly by app.py."""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=APP_DIR, env=child_env(),
+        capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2 # Two spaces per nesting level
+        if depth == 1: # Direct imports of app.py (nested ones are counted in their parent)
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    args = parse_args()
+    results = [run_probe() for _ in range(args.runs)]
+    import_ms = [r['import_ms'] for r in results]
+    create_ms = [r['create_ms'] for r in results]
+    total_ms = [r['import_ms'] + r['create_ms'] for r in results]
+
+    print(f"{'phase':14} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, values in (('import app', import_ms), ('create_app()', create_ms), ('total', total_ms)):
+        print(f"{name:14} {statistics.median(values):>10.1f} {min(values):>8.1f} {max(values):>8.1f}")
+    print(f"\nModules loaded after start-up: {results[0]['modules']}")
+
+    if args.top:
+        print("\nSlowest imports made by app.py (cumulative ms):")
+        for cumulative_ms, name in slowest_imports(args.top):
+            print(f"  {cumulative_ms:>8.1f}  {name}")
+
+    lazy_loaded = sorted({name for r in results for name in r['lazy_loaded']})
+    if lazy_loaded:
+        print(f"\nImported at start-up but should load on first use: {', '.join(lazy_loaded)}")
+        return 1
+    print(f"\nNot loaded at start-up (as intended): {', '.join(LAZY_MODULES)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+# bulk_io.py
+# Bulk import of households and historical payments from CSV/XLSX, and streaming CSV export of payments
+# Every row is validated in memory first; nothing is written unless the whole file is valid
+
+import io
+import csv
+import datetime
+from models import db, Household, Payment
+from chat_import import load_household_map
+from rollups import refresh_after_bulk_write
+
+IMPORT_BATCH_SIZE = 1000 # Rows per executemany INSERT/UPDATE
+EXPORT_BATCH_SIZE = 1000 # Rows fetched per round trip from the export cursor
+MAX_REPORTED_IMPORT_ERRORS = 50 # Validation stops collecting messages after this many
+PAYMENT_STATUSES = ('Pending', 'Paid', 'Partial', 'Receipt Found')
+
+# One file format for import and export: household columns, optionally followed by one payment per row
+# Rows without payment_year/payment_month only create or update the household
+IMPORT_COLUMNS = [
+    'wing', 'flat_number', 'owner_renter_name', 'payment_year', 'payment_month', 'status',
+    'amount_paid', 'expected_amount', 'payment_date', 'receipt_id', 'is_late', 'notes'
+]
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+
+class BulkImportResult:
+    """Summary of a bulk import, used by the upload route and the CLI command to report back."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.households_created = 0
+        self.households_updated = 0
+        self.payments_created = 0
+        self.payments_updated = 0
+        self.errors = [] # Validation errors ("Row N: ..."); when non-empty nothing was written
+
+
+def read_rows(stream, filename):
+    """
+    Yields one dict per data row of a CSV or XLSX upload, keyed by lower-cased header.
+    XLSX support needs openpyxl (pip install openpyxl).
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Reading .xlsx files requires openpyxl (pip install openpyxl).")
+        workbook = load_workbook(stream, read_only=True, data_only=True) # Streams rows instead of loading the sheet
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip().lower() if cell is not None else '' for cell in next(rows, ())]
+            for values in rows:
+                yield {key: value for key, value in zip(header, values) if key}
+        finally:
+            workbook.close()
+    else:
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline=''))
+        reader.fieldnames = [name.strip().lower() for name in (reader.fieldnames or [])]
+        yield from reader
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value) # XLSX numbers come back as floats: 101.0 -> "101"
+    return str(value).strip()
+
+def _number(value, field):
+    text = _text(value).replace(',', '')
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"{field} '{text}' is not a number")
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = _text(value)
+    if not text:
+        return None
+    try:
+        return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"payment_date '{text}' is not in YYYY-MM-DD format")
+
+
+def _validate(rows, existing_households, late_check, result):
+    """
+    Normalizes and checks every row in memory. Duplicate households (_flat_wing_uc) and duplicate
+    household months (_household_month_year_uc) within the file are reported as errors.
+    Returns: (households {(flat, wing): owner or None}, payments {(flat, wing, month, year): values})
+    """
+    households = {}
+    payments = {}
+    first_seen = {} # household/payment key -> first row number, for duplicate messages
+    unnamed = {} # New households with no owner on the row -> row number (error unless another row names them)
+
+    def error(row_num, message):
+        if len(result.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            result.errors.append(f"Row {row_num}: {message}")
+
+    for row_num, row in enumerate(rows, 2): # Row 1 is the header
+        result.rows_read += 1
+        flat_number = _text(row.get('flat_number')).upper()
+        wing = _text(row.get('wing')).upper() or None # Store empty wing as None
+        owner = _text(row.get('owner_renter_name'))
+        if not flat_number:
+            if any(_text(value) for value in row.values()):
+                error(row_num, "flat_number is required")
+            continue # Blank line
+        household_key = (flat_number, wing)
+        hh_identifier = f"{wing+'-' if wing else ''}{flat_number}"
+
+        if owner:
+            if households.get(household_key) not in (None, owner):
+                error(row_num, f"Household {hh_identifier} listed with a different owner/renter on row {first_seen[household_key]}")
+            households[household_key] = owner
+            first_seen.setdefault(household_key, row_num)
+        else:
+            households.setdefault(household_key, None) # Payment row for a household named elsewhere
+            if household_key not in existing_households:
+                unnamed.setdefault(household_key, row_num)
+
+        year_text, month_text = _text(row.get('payment_year')), _text(row.get('payment_month'))
+        if not year_text and not month_text:
+            continue # Household-only row
+        try:
+            year, month = int(year_text), int(month_text)
+            if not 1 <= month <= 12 or not 1900 <= year <= 2999:
+                raise ValueError
+        except ValueError:
+            error(row_num, f"Invalid payment_year/payment_month '{year_text}'/'{month_text}'")
+            continue
+        payment_key = (flat_number, wing, month, year)
+        if payment_key in payments:
+            error(row_num, f"Duplicate payment for {hh_identifier} {year}-{month:02d} (also on row {first_seen[payment_key]})")
+            continue
+        first_seen[payment_key] = row_num
+
+        status = _text(row.get('status')) or 'Pending'
+        status = next((s for s in PAYMENT_STATUSES if s.lower() == status.lower()), status)
+        if status not in PAYMENT_STATUSES:
+            error(row_num, f"Unknown status '{status}' (expected one of: {', '.join(PAYMENT_STATUSES)})")
+            continue
+        try:
+            amount_paid = _number(row.get('amount_paid'), 'amount_paid')
+            expected_amount = _number(row.get('expected_amount'), 'expected_amount')
+            payment_date = _date(row.get('payment_date'))
+        except ValueError as value_err:
+            error(row_num, str(value_err))
+            continue
+        late_text = _text(row.get('is_late')).lower()
+        if not late_text:
+            # Not given: derive it from the payment date like the payment form does
+            is_late = bool(payment_date and late_check(payment_date, month, year, wing))
+        elif late_text in TRUE_VALUES or late_text in FALSE_VALUES:
+            is_late = late_text in TRUE_VALUES
+        else:
+            error(row_num, f"is_late '{late_text}' is not yes/no")
+            continue
+        payments[payment_key] = {
+            'payment_month': month,
+            'payment_year': year,
+            'status': status,
+            'amount_paid': amount_paid,
+            'expected_amount': expected_amount,
+            'payment_date': payment_date,
+            'receipt_id': _text(row.get('receipt_id')) or None,
+            'is_late': is_late,
+            'notes': _text(row.get('notes')) or None
+        }
+
+    for (flat_number, wing), row_num in unnamed.items():
+        if households[(flat_number, wing)] is None:
+            error(row_num, f"Household {wing+'-' if wing else ''}{flat_number} does not exist - owner_renter_name is required")
+    return households, payments
+
+
+def _batches(items):
+    for start in range(0, len(items), IMPORT_BATCH_SIZE):
+        yield items[start:start + IMPORT_BATCH_SIZE]
+
+
+def import_rows(rows, late_check):
+    """
+    Validates all rows, then upserts households and payments with batched executemany
+    statements in a single transaction. Existing rows (matched on the unique constraints)
+    are updated, new ones inserted.
+    `late_check(payment_date, month, year, wing)` derives is_late when the file leaves it empty.
+    Returns: BulkImportResult (nothing is written when result.errors is non-empty)
+    """
+    result = BulkImportResult()
+    household_map = load_household_map()
+    households, payments = _validate(rows, household_map, late_check, result)
+    if result.errors:
+        return result
+
+    # --- Households ---
+    owners = {household_id: owner for household_id, owner in db.session.execute(db.select(Household.id, Household.owner_renter_name))}
+    new_households = [
+        {'flat_number': flat_number, 'wing': wing, 'owner_renter_name': owner}
+        for (flat_number, wing), owner in households.items() if (flat_number, wing) not in household_map
+    ]
+    changed_households = [
+        {'id': household_map[key], 'owner_renter_name': owner}
+        for key, owner in households.items()
+        if key in household_map and owner is not None and owners[household_map[key]] != owner
+    ]
+    for batch in _batches(new_households):
+        db.session.execute(db.insert(Household), batch)
+    for batch in _batches(changed_households):
+        db.session.execute(db.update(Household), batch) # Bulk UPDATE by primary key
+    result.households_created = len(new_households)
+    result.households_updated = len(changed_households)
+    if new_households:
+        household_map = load_household_map() # Picks up the ids of the inserted households
+
+    # --- Payments ---
+    rows_by_key = {
+        (household_map[(flat_number, wing)], month, year): values
+        for (flat_number, wing, month, year), values in payments.items()
+    }
+    household_ids = sorted({household_id for household_id, _, _ in rows_by_key})
+    existing_ids = {}
+    for batch in _batches(household_ids):
+        existing_ids.update(
+            ((household_id, month, year), payment_id)
+            for payment_id, household_id, month, year in db.session.execute(
+                db.select(Payment.id, Payment.household_id, Payment.payment_month, Payment.payment_year)
+                .where(Payment.household_id.in_(batch))
+            )
+        )
+    new_payments = []
+    changed_payments = []
+    for key, values in rows_by_key.items():
+        if key in existing_ids:
+            changed_payments.append(dict(values, id=existing_ids[key]))
+        else:
+            new_payments.append(dict(values, household_id=key[0]))
+    for batch in _batches(new_payments):
+        # render_nulls keeps rows with and without optional values in one executemany batch
+        db.session.execute(db.insert(Payment).execution_options(render_nulls=True), batch)
+    for batch in _batches(changed_payments):
+        db.session.execute(db.update(Payment), batch)
+    result.payments_created = len(new_payments)
+    result.payments_updated = len(changed_payments)
+
+    refresh_after_bulk_write({(year, month) for _, month, year in rows_by_key}, household_ids)
+    db.session.commit()
+    return result
+
+
+def parse_period(text):
+    """Parses a 'YYYY-MM' month (as sent by <input type="month">). Returns: (year, month)"""
+    try:
+        parsed = datetime.datetime.strptime(text.strip(), '%Y-%m')
+    except (ValueError, AttributeError):
+        raise ValueError(f"Invalid month '{text}'. Please use YYYY-MM.")
+    return parsed.year, parsed.month
+
+
+def iter_payment_rows(start, end):
+    """
+    Yields payments from start to end (inclusive (year, month) tuples) as export rows in
+    IMPORT_COLUMNS order, ordered by month, wing and flat. Rows are fetched from a streaming
+    (server-side where supported) cursor in batches, so large exports are never held in memory.
+    """
+    period = db.tuple_(Payment.payment_year, Payment.payment_month)
+    stmt = db.select(
+        Household.wing, Household.flat_number, Household.owner_renter_name,
+        Payment.payment_year, Payment.payment_month, Payment.status, Payment.amount_paid,
+        Payment.expected_amount, Payment.payment_date, Payment.receipt_id, Payment.is_late, Payment.notes
+    ).join(Household, Household.id == Payment.household_id).where(
+        period >= db.tuple_(db.literal(start[0]), db.literal(start[1])),
+        period <= db.tuple_(db.literal(end[0]), db.literal(end[1]))
+    ).order_by(Payment.payment_year, Payment.payment_month, Household.wing, Household.flat_number)
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        wing, flat_number, owner, year, month, status, amount_paid, expected_amount, payment_date, receipt_id, is_late, notes = row
+        yield [
+            wing or '', flat_number, owner, year, month, status,
+            '' if amount_paid is None else f"{amount_paid:.2f}",
+            '' if expected_amount is None else f"{expected_amount:.2f}",
+            payment_date.strftime('%Y-%m-%d') if payment_date else '',
+            receipt_id or '', 'yes' if is_late else 'no', notes or ''
+        ]
+
+
+def iter_payments_csv(start, end):
+    """Yields the payment export as CSV text chunks (header first), one chunk per cursor batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(IMPORT_COLUMNS)
+    for count, row in enumerate(iter_payment_rows(start, end), 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,339 @@
+# chat_import.py
+# Incremental import of WhatsApp chat exports into payment records
+# Messages are streamed from chat_parser; matched receipts are applied to Payment in batched commits
+# "Export with media" ZIPs are OCR'd in parallel by a background job into a reviewable batch
+
+import io
+import os
+import re
+import json
+import time
+import uuid
+import datetime
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Household, Payment, ImportedChatMessage
+from rollups import refresh_after_bulk_write
+from late_rules import load_late_rules
+from chat_parser import iter_messages, is_attachment_message, extract_caption, extract_attachment_name, message_hash, parse_flat_wing_from_caption
+
+CHAT_IMPORT_BATCH_SIZE = 500 # Number of matched receipts applied per commit
+HASH_LOOKUP_BATCH_SIZE = 500 # Attachment messages checked against earlier imports per query
+RECEIPT_BATCH_MAX_AGE = 24 * 3600 # Seconds a receipt batch (upload or proposals) is kept for review
+RECEIPT_BATCH_TIMEOUT = 3600 # Seconds after which a batch still running is treated as lost (e.g. worker restarted)
+RECEIPT_BATCH_ID_REGEX = re.compile(r'[0-9a-f]{32}\Z') # Batch IDs arrive from URLs and forms
+
+
+class ChatImportResult:
+    """Summary of a chat import run, used by the upload route to report back to the user."""
+
+    def __init__(self):
+        self.lines_processed = 0
+        self.skipped_count = 0 # Attachment messages already processed by an earlier import
+        self.updated_count = 0 # Payment records created or marked 'Receipt Found'
+        self.found_receipts = []
+        self.errors = []
+
+
+def load_household_map():
+    """Loads a (flat_number, wing) -> household id map with a single query."""
+    rows = db.session.execute(db.select(Household.flat_number, Household.wing, Household.id))
+    return {(flat_number, wing): household_id for flat_number, wing, household_id in rows}
+
+
+def import_chat(lines, batch_size=CHAT_IMPORT_BATCH_SIZE):
+    """
+    Parses chat export lines and applies matched receipts to payment records.
+    Attachment messages seen by a previous import (same content hash) are skipped,
+    so re-uploading a longer export of the same group only processes the new messages.
+    Returns: ChatImportResult
+    """
+    result = ChatImportResult()
+    household_map = load_household_map()
+    seen_hashes = set() # Messages matched by this run (guards against the same message appearing twice in one export)
+    matches = [] # (hash, timestamp, household_id) waiting to be committed
+
+    for messages in _attachment_batches(iter_messages(_count_lines(lines, result)), HASH_LOOKUP_BATCH_SIZE):
+        digests = [message_hash(message) for message in messages]
+        # Only this batch's hashes are looked up, so earlier imports are never loaded in full
+        imported_hashes = set(db.session.scalars(
+            db.select(ImportedChatMessage.message_hash).where(ImportedChatMessage.message_hash.in_(set(digests)))
+        ))
+        for message, digest in zip(messages, digests):
+            if digest in imported_hashes or digest in seen_hashes:
+                result.skipped_count += 1
+                continue
+            if message.timestamp is None:
+                result.errors.append(f"Could not parse timestamp '{message.timestamp_str}' (Line ~{message.line_num})")
+                continue
+
+            # Attempt to find household from caption (only pairs that match a known household are accepted)
+            caption = extract_caption(message.content)
+            flat_num, wing_char = parse_flat_wing_from_caption(caption, household_map)
+            if not flat_num:
+                unmatched_flat, unmatched_wing = parse_flat_wing_from_caption(caption)
+                if unmatched_flat:
+                    result.errors.append(f"Household not found for: Flat {unmatched_flat}, Wing {unmatched_wing} (Line ~{message.line_num})")
+                continue
+            household_id = household_map[(flat_num, wing_char)]
+
+            seen_hashes.add(digest)
+            result.found_receipts.append(f"Flat {wing_char+'-' if wing_char else ''}{flat_num} (Msg Date: {message.timestamp.strftime('%Y-%m-%d')})")
+            matches.append((digest, message.timestamp, household_id))
+            if len(matches) >= batch_size:
+                _apply_matches(matches, result)
+                matches = []
+
+    if matches:
+        _apply_matches(matches, result)
+    return result
+
+
+def _attachment_batches(messages, size):
+    """Yields: lists of up to `size` attachment messages, in chat order."""
+    batch = []
+    for message in messages:
+        if is_attachment_message(message.content):
+            batch.append(message)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _count_lines(lines, result):
+    for line in lines:
+        result.lines_processed += 1
+        yield line
+
+
+def _apply_matches(matches, result):
+    """Marks the matched months as 'Receipt Found' (creating missing records) and records the messages as imported."""
+    keys = {(household_id, ts.month, ts.year) for _, ts, household_id in matches}
+    existing = db.session.scalars(
+        db.select(Payment).where(
+            db.tuple_(Payment.household_id, Payment.payment_month, Payment.payment_year).in_(keys)
+        )
+    )
+    for payment in existing:
+        keys.discard((payment.household_id, payment.payment_month, payment.payment_year))
+        if payment.status == 'Pending':
+            payment.status = 'Receipt Found'
+            result.updated_count += 1
+
+    # New rows go in as executemany INSERTs (adding ORM objects costs one INSERT per row on SQLite)
+    try:
+        if keys:
+            db.session.execute(db.insert(Payment), [
+                {'household_id': household_id, 'payment_month': month, 'payment_year': year, 'status': 'Receipt Found', 'is_late': False}
+                for household_id, month, year in keys
+            ])
+            refresh_after_bulk_write({(year, month) for _, month, year in keys}, {household_id for household_id, _, _ in keys})
+        result.updated_count += len(keys)
+        db.session.execute(db.insert(ImportedChatMessage), [
+            {'message_hash': digest, 'message_timestamp': ts} for digest, ts, _ in matches
+        ])
+        db.session.commit()
+    except Exception as commit_err:
+        db.session.rollback()
+        result.errors.append(f"Database commit error after parsing: {commit_err}")
+
+
+def build_receipt_batch(zip_file, ocr_queue, late_check, image_extensions):
+    """
+    Reads a WhatsApp "export with media" ZIP (path or file object) without extracting it, pairs each attachment
+    message with its image member and OCRs all matched images in parallel.
+    `late_check(payment_date, month, year, wing)` decides the proposed is_late flag.
+    Returns: (proposals, errors) - proposals are JSON-serialisable dicts describing one Payment
+    update each, sorted by flat and month for review
+    """
+    errors = []
+    with zipfile.ZipFile(zip_file) as archive:
+        members = {os.path.basename(info.filename): info for info in archive.infolist() if not info.is_dir()}
+        chat_members = [info for name, info in members.items() if name.lower().endswith('.txt')]
+        if not chat_members:
+            raise ValueError("No chat .txt file found in the ZIP archive.")
+        # Prefer the chat transcript ("_chat.txt" / "WhatsApp Chat with ...txt") over other text files
+        chat_member = next((info for info in chat_members if 'chat' in info.filename.lower()), chat_members[0])
+
+        household_map = load_household_map()
+        identifiers = {household_id: f"{wing+'-' if wing else ''}{flat_number}" for (flat_number, wing), household_id in household_map.items()}
+        wings = {household_id: wing for (_, wing), household_id in household_map.items()}
+        proposals = []
+        with archive.open(chat_member) as raw:
+            lines = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+            for message in iter_messages(lines):
+                if not is_attachment_message(message.content):
+                    continue
+                attachment = extract_attachment_name(message.content)
+                if not attachment or attachment.rsplit('.', 1)[-1].lower() not in image_extensions:
+                    continue
+                if attachment not in members:
+                    errors.append(f"Image '{attachment}' not found in the archive (Line ~{message.line_num})")
+                    continue
+                if message.timestamp is None:
+                    errors.append(f"Could not parse timestamp '{message.timestamp_str}' (Line ~{message.line_num})")
+                    continue
+                caption = extract_caption(message.content)
+                flat_num, wing_char = parse_flat_wing_from_caption(caption, household_map)
+                household_id = household_map.get((flat_num, wing_char)) if flat_num else None
+                if household_id is None:
+                    errors.append(f"No household matched for '{attachment}' (caption: {caption[:50] or '-'}, Line ~{message.line_num})")
+                    continue
+                proposals.append({
+                    'household_id': household_id,
+                    'hh_identifier': identifiers[household_id],
+                    'wing': wings[household_id],
+                    'month': message.timestamp.month,
+                    'year': message.timestamp.year,
+                    'message_date': message.timestamp.strftime('%Y-%m-%d'),
+                    'attachment': attachment,
+                    'caption': caption,
+                    'line_num': message.line_num
+                })
+
+        # OCR every matched image in parallel; members are read lazily as workers free up
+        images = ((index, archive.read(members[proposal['attachment']])) for index, proposal in enumerate(proposals))
+        for index, data in ocr_queue.run_batch(images):
+            proposal = proposals[index]
+            proposal['error'] = data.get('error')
+            proposal['warnings'] = data.get('warnings', [])
+            proposal['amount'] = data.get('amount')
+            proposal['receipt_id'] = data.get('receipt_id')
+            # Fall back to the date the receipt was posted when OCR finds no date
+            proposal['payment_date'] = data['date'] if data.get('date') else proposal['message_date']
+
+    for proposal in proposals:
+        payment_date = datetime.datetime.strptime(proposal['payment_date'], '%Y-%m-%d').date()
+        proposal['is_late'] = bool(late_check(payment_date, proposal['month'], proposal['year'], proposal['wing']))
+    proposals.sort(key=lambda p: (p['hh_identifier'], p['year'], p['month'], p['line_num']))
+    return proposals, errors
+
+
+def apply_receipt_batch(rows):
+    """
+    Applies reviewed receipt proposals to payment records in one transaction.
+    `rows` are dicts with household_id, month, year, amount, receipt_id, payment_date (date or None) and is_late;
+    a later row for the same household and month overrides an earlier one.
+    Returns: number of payment records updated or created
+    """
+    rows_by_key = {(row['household_id'], row['month'], row['year']): row for row in rows}
+    if not rows_by_key:
+        return 0
+    payments = {
+        (payment.household_id, payment.payment_month, payment.payment_year): payment
+        for payment in db.session.scalars(
+            db.select(Payment).where(
+                db.tuple_(Payment.household_id, Payment.payment_month, Payment.payment_year).in_(rows_by_key)
+            )
+        )
+    }
+    for key, row in rows_by_key.items():
+        payment = payments.get(key)
+        if payment is None:
+            payment = Payment(household_id=key[0], payment_month=key[1], payment_year=key[2])
+            db.session.add(payment)
+        payment.amount_paid = row['amount']
+        payment.receipt_id = row['receipt_id']
+        payment.payment_date = row['payment_date']
+        payment.is_late = row['is_late']
+        payment.status = 'Paid'
+    db.session.commit()
+    return len(rows_by_key)
+
+
+class ReceiptBatchJobs:
+    """
+    Runs build_receipt_batch() for uploaded ZIPs on a background thread, so the upload request
+    returns at once and the review page polls for the proposals.
+    Each batch lives in `batch_dir` as <id>.zip while it runs, then <id>.json (proposals) or
+    <id>.error, so any web worker can answer status polls for a batch started by another one.
+    """
+
+    def __init__(self, batch_dir, ocr_queue, image_extensions):
+        self.batch_dir = batch_dir
+        self.ocr_queue = ocr_queue
+        self.image_extensions = image_extensions
+        self._executor = None
+
+    def _get_executor(self):
+        # Created on first use so importing the app never starts threads; one batch runs at a time
+        # per web worker (each batch already spreads its images over the whole OCR pool)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def _path(self, batch_id, suffix):
+        return os.path.join(self.batch_dir, f"{batch_id}.{suffix}")
+
+    def _write(self, path, data):
+        tmp_path = path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path) # Atomic, so pollers never see a partial file
+
+    def start(self, app, zip_stream, filename):
+        """
+        Saves the uploaded ZIP and queues its OCR batch.
+        Returns: batch id
+        """
+        os.makedirs(self.batch_dir, exist_ok=True)
+        self._evict()
+        batch_id = uuid.uuid4().hex
+        with open(self._path(batch_id, 'zip'), 'wb') as f:
+            while chunk := zip_stream.read(1024 * 1024):
+                f.write(chunk)
+        self._get_executor().submit(self._run, app, batch_id, filename)
+        return batch_id
+
+    def _run(self, app, batch_id, filename):
+        zip_path = self._path(batch_id, 'zip')
+        try:
+            with app.app_context():
+                proposals, errors = build_receipt_batch(zip_path, self.ocr_queue, load_late_rules().is_late, self.image_extensions)
+            self._write(self._path(batch_id, 'json'), {'filename': filename, 'proposals': proposals, 'errors': errors})
+        except Exception as e:
+            self._write(self._path(batch_id, 'error'), {'filename': filename, 'error': str(e)})
+        finally:
+            os.remove(zip_path)
+
+    def status(self, batch_id):
+        """
+        Returns: dict with 'status' ('pending', 'done', 'error' or 'unknown'); done batches add
+        'filename', 'proposals' and 'errors', failed ones 'filename' and 'error'
+        """
+        if not RECEIPT_BATCH_ID_REGEX.match(batch_id or ''):
+            return {'status': 'unknown'}
+        for suffix, status in (('json', 'done'), ('error', 'error')):
+            try:
+                with open(self._path(batch_id, suffix), 'r', encoding='utf-8') as f:
+                    return dict(json.load(f), status=status)
+            except (OSError, ValueError):
+                pass
+        try:
+            started_at = os.path.getmtime(self._path(batch_id, 'zip'))
+        except OSError:
+            return {'status': 'unknown'}
+        if time.time() - started_at > RECEIPT_BATCH_TIMEOUT:
+            return {'status': 'error', 'error': "Processing the ZIP did not finish. Please upload it again."}
+        return {'status': 'pending'}
+
+    def discard(self, batch_id):
+        """Removes a reviewed batch."""
+        if RECEIPT_BATCH_ID_REGEX.match(batch_id or ''):
+            for suffix in ('json', 'error'):
+                try:
+                    os.remove(self._path(batch_id, suffix))
+                except OSError:
+                    pass # Already applied through another tab or evicted
+
+    def _evict(self):
+        now = time.time()
+        for entry in os.scandir(self.batch_dir):
+            # Finished batches never reviewed, and uploads left behind by a worker that was restarted
+            if now - entry.stat().st_mtime > RECEIPT_BATCH_MAX_AGE:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
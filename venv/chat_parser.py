@@ -0,0 +1,224 @@
+# chat_parser.py
+# Streaming parser for WhatsApp chat exports (.txt)
+# Yields one message record at a time so large exports never have to be held in memory
+
+import re
+import datetime
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+# --- Precompiled Patterns ---
+# WhatsApp line starts: "21/03/25, 9:15 pm - Sender Name: message text" (Android) or
+# "[21/03/25, 9:15:42 PM] Sender Name: message text" (iOS, often preceded by a left-to-right mark)
+# The timestamp parts are captured separately so the common formats can be parsed without dateutil
+LINE_START_REGEX = re.compile(
+    r'^\u200e?(\[)?((\d{1,2})/(\d{1,2})/(\d{2,4}),\s+(\d{1,2}):(\d{2})(?::(\d{2}))?(?:[\s\u202f]*(AM|PM))?)'
+    r'(?(1)\]\s*|\s+-\s+)([^:]+):\s+(.*)',
+    re.IGNORECASE
+)
+ATTACHMENT_MARKERS = ('<attached:', 'image omitted', '<media omitted>', '(file attached)')
+# Attachment file name in "export with media" chats: "<attached: 00000012-PHOTO-2025-03-05.jpg>" (iOS)
+# or "IMG-20250305-WA0012.jpg (file attached)" (Android)
+ATTACHED_FILE_REGEX = re.compile(r'<attached:\s*([^>]+?)\s*>|^\s*(\S+?)\s+\(file attached\)', re.IGNORECASE)
+# Caption patterns (keyword patterns run on the lower-cased caption)
+FLAT_REGEX = re.compile(r'flat\s*(?:no\.?|number|[:\-])?\s*([\w\-]+)')
+WING_REGEX = re.compile(r'wing\s*[:\-]?\s*([a-z]+)')
+PAYMENT_FOR_REGEX = re.compile(r'payment\s+for\s+(\d+)\s+([a-z])')
+COMBINED_REGEX = re.compile(r'(?:^|\s)([a-zA-Z])\s*-?\s*(\d+)') # Wing-Flat, Wing Flat or WingFlat
+AFTER_WING_REGEX = re.compile(r'\s+-?\s*(\d+)') # Applied right after the wing text, when only the wing is known
+# Every wing/flat pair in a caption: "A-101" / "B/502" (letter first) or "101 B" / bare "101" (number first)
+CAPTION_PAIR_REGEX = re.compile(r'(?<![A-Za-z\d])([A-Za-z])\s*[\-/]?\s*(\d+)|(\d+)(?:\s*[\-/]?\s*([A-Za-z])(?![A-Za-z]))?')
+CAPTION_CACHE_SIZE = 4096 # Distinct captions memoized by the caption parser
+
+# A single parsed chat message
+# line_num is the line the message starts on; timestamp is a datetime (or None if unparseable)
+ChatMessage = namedtuple('ChatMessage', ['line_num', 'timestamp_str', 'timestamp', 'sender', 'content'])
+
+
+def parse_timestamp(timestamp_str, parts=None):
+    """
+    Parses a chat timestamp (day first, as exported by WhatsApp).
+    `parts` are the (day, month, year, hour, minute, second, am_pm) groups captured by LINE_START_REGEX;
+    when they form a valid date they are used directly, otherwise dateutil is tried.
+    Returns: datetime.datetime or None
+    """
+    if parts:
+        day, month, year, hour, minute, second, am_pm = parts
+        try:
+            year = int(year)
+            if year < 100:
+                year += 2000
+            hour = int(hour)
+            if am_pm:
+                am_pm = am_pm.upper()
+                if am_pm == 'PM' and hour < 12:
+                    hour += 12
+                elif am_pm == 'AM' and hour == 12:
+                    hour = 0
+            return datetime.datetime(year, int(month), int(day), hour, int(minute), int(second or 0))
+        except ValueError:
+            pass # e.g. month/day exported the other way round - let dateutil decide
+    from dateutil.parser import parse as dateutil_parse # Imported on first use; most exports never need it
+    try:
+        return dateutil_parse(timestamp_str.replace('\u202f', ' '), dayfirst=True)
+    except (ValueError, OverflowError):
+        return None
+
+
+def iter_messages(lines):
+    """
+    Generator turning an iterable of chat export lines into ChatMessage records.
+    Lines that don't start a new message are treated as continuations of the previous one.
+    """
+    current = None # [line_num, timestamp_str, parts, sender, content]
+    for line_num, line in enumerate(lines, 1):
+        match = LINE_START_REGEX.match(line)
+        if match:
+            if current:
+                yield _build_message(current)
+            groups = match.groups()
+            current = [line_num, groups[1], groups[2:9], groups[9].strip('\u200e'), groups[10].rstrip('\r\n')]
+        elif current:
+            # Append the line to the current message content (stripping leading/trailing whitespace)
+            current[4] += "\n" + line.strip()
+    # --- The very last message in the file ---
+    if current:
+        yield _build_message(current)
+
+
+def _build_message(current):
+    line_num, timestamp_str, parts, sender, content = current
+    return ChatMessage(line_num, timestamp_str, parse_timestamp(timestamp_str, parts), sender, content)
+
+
+def is_attachment_message(content):
+    """Checks whether a message contains an image/media attachment indicator."""
+    content_lower = content.lower()
+    return any(marker in content_lower for marker in ATTACHMENT_MARKERS)
+
+
+def extract_caption(content):
+    """Extracts the caption text accompanying an attachment (often follows the attachment indicator)."""
+    if '<attached:' in content:
+        return content.split('>')[-1].strip()
+    if '<Media omitted>' in content:
+        # If media omitted is followed by text, use that text; if nothing follows, there is no caption
+        return content.split('<Media omitted>')[-1].strip()
+    if 'image omitted' in content:
+        return "" # Usually no caption follows this
+    if '(file attached)' in content:
+        return content.split('(file attached)', 1)[-1].strip()
+    return content
+
+
+def extract_attachment_name(content):
+    """Returns the attached file name from an "export with media" message, or None."""
+    match = ATTACHED_FILE_REGEX.search(content)
+    if not match:
+        return None
+    return (match.group(1) or match.group(2)).strip('\u200e') # Exports often include left-to-right marks
+
+
+def message_hash(message):
+    """Returns a stable SHA-256 hex digest identifying a message across repeated exports."""
+    key = f"{message.timestamp_str}\x1f{message.sender}\x1f{message.content}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def parse_flat_wing_from_caption(caption, known_households=None):
+    """
+    Attempts to extract flat number and wing from caption text.
+    If `known_households` (a set or dict keyed by (flat_number, wing)) is given, only a pair that
+    exists in it is returned - so "I 201 paid" is not read as Wing I, Flat 201 - and the other
+    flat/wing pairs mentioned in the caption are tried before giving up.
+    Returns: tuple (flat_number, wing) or (None, None)
+    """
+    # Handle potential None caption
+    if caption is None:
+        return None, None
+    primary = _caption_primary(caption)
+    if known_households is None or primary in known_households:
+        return primary
+    for candidate in _caption_alternatives(caption):
+        if candidate in known_households:
+            return candidate
+    return None, None
+
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def _caption_primary(caption):
+    """Best-guess (flat_number, wing) for a caption; either part may be None."""
+    caption_lower = caption.lower()
+    flat_number = None
+    wing = None
+
+    # Keyword patterns only run when the keyword is present at all
+    # Pattern 1: "Flat A-101", "Flat: 101", "Flat No 101" (captures number/alphanumeric after "flat")
+    if 'flat' in caption_lower:
+        match_flat = FLAT_REGEX.search(caption_lower)
+        if match_flat:
+            flat_number = match_flat.group(1).upper().replace('-', '') or None # Remove hyphens
+    # Pattern 2: "Wing C", "Wing: A" (captures letters after "wing")
+    if 'wing' in caption_lower:
+        match_wing = WING_REGEX.search(caption_lower)
+        if match_wing:
+            wing = match_wing.group(1).upper()
+
+    if not flat_number and not wing:
+        # Pattern 3: Combined like "A-101", "C 203", "D601" (assumes Wing is letter, Flat is number)
+        match_combined = COMBINED_REGEX.search(caption)
+        if match_combined:
+            return match_combined.group(2), match_combined.group(1).upper()
+    elif flat_number and not wing:
+        # If only flat number found, look for a wing letter just before it ("A 101" or "C-101")
+        wing = _letter_before(caption, flat_number)
+    elif wing and not flat_number:
+        # If only wing found, try finding number after wing "Wing A 101"
+        wing_lower = wing.lower()
+        start = caption_lower.find(wing_lower)
+        while start != -1:
+            match_flat_after = AFTER_WING_REGEX.match(caption_lower, start + len(wing_lower))
+            if match_flat_after:
+                flat_number = match_flat_after.group(1)
+                break
+            start = caption_lower.find(wing_lower, start + 1)
+
+    # "Payment for 101 B"
+    if not flat_number and 'payment' in caption_lower:
+        match_payment_for = PAYMENT_FOR_REGEX.search(caption_lower)
+        if match_payment_for:
+            return match_payment_for.group(1), match_payment_for.group(2).upper()
+
+    return flat_number, wing
+
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def _caption_alternatives(caption):
+    """All complete (flat_number, wing) pairs mentioned in a caption, in order of appearance (one scan)."""
+    alternatives = []
+    for wing_before, flat_after, number, wing_after in CAPTION_PAIR_REGEX.findall(caption):
+        if flat_after:
+            alternatives.append((flat_after, wing_before.upper())) # "A-101", "C 203", "D601", "B/502"
+        else:
+            if wing_after:
+                alternatives.append((number, wing_after.upper())) # "101 B", "101-B"
+            alternatives.append((number, None)) # Society without wings
+    return tuple(dict.fromkeys(alternatives))
+
+
+def _letter_before(caption, flat_number):
+    """Returns the (upper-cased) letter directly before an occurrence of flat_number, allowing spaces and one hyphen between."""
+    start = caption.find(flat_number)
+    while start != -1:
+        j = start - 1
+        while j >= 0 and caption[j].isspace():
+            j -= 1
+        if j >= 0 and caption[j] == '-':
+            j -= 1
+            while j >= 0 and caption[j].isspace():
+                j -= 1
+        if j >= 0 and caption[j].isascii() and caption[j].isalpha():
+            return caption[j].upper()
+        start = caption.find(flat_number, start + 1)
+    return None
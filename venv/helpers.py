@@ -0,0 +1,122 @@
+# helpers.py
+# Helpers shared by the blueprints: upload checks, payment record creation and the joined household/payment grid
+
+import datetime
+from models import db, Household, Payment
+from late_rules import load_late_rules
+from rollups import refresh_after_bulk_write
+
+# --- Constants ---
+ALLOWED_EXTENSIONS_CHAT = {'txt'}
+ALLOWED_EXTENSIONS_ZIP = {'zip'}
+ALLOWED_EXTENSIONS_IMG = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+ALLOWED_EXTENSIONS_BULK = {'csv', 'xlsx'}
+
+
+# --- Utility Functions ---
+def allowed_file(filename, allowed_extensions):
+    """Checks if the uploaded file extension is allowed."""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in allowed_extensions
+
+def get_or_create_payment_record(household_id, month, year):
+    """Gets an existing payment record or creates a new one if it doesn't exist."""
+    payment = Payment.query.filter_by(
+        household_id=household_id,
+        payment_month=month,
+        payment_year=year
+    ).first()
+    if not payment:
+        payment = Payment(
+            household_id=household_id,
+            payment_month=month,
+            payment_year=year,
+            status='Pending', # Default status
+            is_late=False # Default late status
+        )
+        db.session.add(payment)
+        # Commit happens in the calling function or route
+    return payment
+
+def is_payment_late(payment_date, month, year, wing=None):
+    """
+    Checks whether a payment made on payment_date is late for the given payment month/year,
+    using the saved late-payment rules (cut-off day, grace period, holiday shift) for the wing.
+    Batch callers should use load_late_rules().is_late directly so the rules are loaded once.
+    """
+    return load_late_rules().is_late(payment_date, month, year, wing)
+
+def ensure_payment_records(month, year):
+    """
+    Creates the missing 'Pending' payment records for every household for the given month/year.
+    Uses a single INSERT ... SELECT instead of one lookup per household; rows that already
+    exist are skipped (insert-or-ignore against _household_month_year_uc).
+    Returns: number of rows inserted
+    """
+    already_exists = db.select(Payment.id).where(
+        Payment.household_id == Household.id,
+        Payment.payment_month == month,
+        Payment.payment_year == year
+    ).exists()
+    missing_ids = db.session.scalars(db.select(Household.id).where(~already_exists)).all()
+    if not missing_ids:
+        return 0
+    missing = db.select(
+        Household.id,
+        db.literal(month),
+        db.literal(year),
+        db.literal('Pending'),
+        db.literal(False),
+        db.literal(datetime.datetime.utcnow())
+    ).where(~already_exists)
+    columns = ['household_id', 'payment_month', 'payment_year', 'status', 'is_late', 'created_at']
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # ON CONFLICT DO NOTHING guards against a concurrent request inserting the same rows
+        stmt = dialect_insert(Payment).from_select(columns, missing).on_conflict_do_nothing(
+            index_elements=['household_id', 'payment_month', 'payment_year']
+        )
+    else:
+        stmt = db.insert(Payment).from_select(columns, missing)
+    result = db.session.execute(stmt)
+    refresh_after_bulk_write([(year, month)], missing_ids)
+    return result.rowcount or 0
+
+def month_periods(end_month, end_year, count):
+    """Returns a list of (year, month) tuples for the `count` months ending at end_month/end_year, oldest first."""
+    end_index = end_year * 12 + (end_month - 1)
+    return [(i // 12, i % 12 + 1) for i in range(end_index - count + 1, end_index + 1)]
+
+def load_payment_grid(periods):
+    """
+    Loads every household with its payment records for the given (year, month) periods
+    using one outer-joined query (households without a record for a period are still returned).
+    Returns: list of (household, {(year, month): payment}) ordered by wing and flat number
+    """
+    payment_filter = db.and_(
+        Payment.household_id == Household.id,
+        db.tuple_(Payment.payment_year, Payment.payment_month).in_(periods)
+    ) if len(periods) > 1 else db.and_(
+        Payment.household_id == Household.id,
+        Payment.payment_year == periods[0][0],
+        Payment.payment_month == periods[0][1]
+    )
+    rows = db.session.execute(
+        db.select(Household, Payment)
+        .outerjoin(Payment, payment_filter)
+        .order_by(Household.wing, Household.flat_number, Household.id)
+    ).all()
+
+    grid = []
+    for household, payment in rows:
+        # Rows arrive grouped by household because of the ORDER BY
+        if not grid or grid[-1][0].id != household.id:
+            grid.append((household, {}))
+        if payment is not None:
+            grid[-1][1][(payment.payment_year, payment.payment_month)] = payment
+    return grid
@@ -0,0 +1,123 @@
+# instrumentation.py
+# Opt-in per-request metrics: wall time, SQL statement count and SQL time (from SQLAlchemy engine events)
+# Enabled with METRICS_ENABLED=1; results go out in a Server-Timing header and are aggregated on /_metrics
+
+import time
+import threading
+from flask import g, request, render_template, jsonify, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_SQL_WARN = 50 # Statements per request above which a request is flagged (likely N+1 query pattern)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_metrics' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_metrics' in g and conn.info.get('query_start'):
+        metrics = g.request_metrics
+        metrics['sql_count'] += 1
+        metrics['sql_time'] += time.perf_counter() - conn.info['query_start'].pop()
+
+
+class RequestMetrics:
+    """Aggregated per-endpoint request metrics (kept in memory, per process)."""
+
+    def __init__(self, sql_warn=METRICS_SQL_WARN):
+        self.sql_warn = sql_warn
+        self.endpoints = {} # endpoint -> stats dict
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, wall_time, sql_count, sql_time):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                'endpoint': endpoint, 'requests': 0, 'wall_total': 0.0, 'wall_max': 0.0,
+                'sql_total': 0, 'sql_max': 0, 'sql_time_total': 0.0, 'flagged': 0
+            })
+            stats['requests'] += 1
+            stats['wall_total'] += wall_time
+            stats['wall_max'] = max(stats['wall_max'], wall_time)
+            stats['sql_total'] += sql_count
+            stats['sql_max'] = max(stats['sql_max'], sql_count)
+            stats['sql_time_total'] += sql_time
+            if sql_count > self.sql_warn:
+                stats['flagged'] += 1
+
+    def snapshot(self):
+        """Returns: list of per-endpoint stats dicts (with averages), most SQL statements first."""
+        with self._lock:
+            rows = [dict(stats) for stats in self.endpoints.values()]
+        for row in rows:
+            row['wall_avg_ms'] = row['wall_total'] / row['requests'] * 1000
+            row['wall_max_ms'] = row['wall_max'] * 1000
+            row['sql_avg'] = row['sql_total'] / row['requests']
+            row['sql_time_avg_ms'] = row['sql_time_total'] / row['requests'] * 1000
+        rows.sort(key=lambda row: (row['sql_max'], row['wall_avg_ms']), reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+def init_metrics(app):
+    """
+    Registers the request hooks, engine events and the /_metrics page when
+    app.config['METRICS_ENABLED'] is set. Does nothing otherwise.
+    Returns: RequestMetrics or None
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        return None
+    metrics = RequestMetrics(app.config.get('METRICS_SQL_WARN', METRICS_SQL_WARN))
+    # Listening on the Engine class covers every engine the app creates
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0}
+
+    def finish(current, endpoint):
+        wall_time = time.perf_counter() - current['start']
+        metrics.record(endpoint, wall_time, current['sql_count'], current['sql_time'])
+        if current['sql_count'] > metrics.sql_warn:
+            app.logger.warning(
+                "%s %s ran %d SQL statements (> %d) - possible N+1 query pattern",
+                current['method'], current['path'], current['sql_count'], metrics.sql_warn
+            )
+        return wall_time
+
+    @app.after_request
+    def finish_request_metrics(response):
+        current = g.get('request_metrics')
+        if current is None or request.endpoint == 'metrics_page':
+            return response
+        current.update(method=request.method, path=request.full_path)
+        endpoint = request.endpoint or request.path
+        if response.is_streamed:
+            # The body (and its queries) is produced after this hook, so finish once the stream is closed;
+            # the headers are already sent by then, so streamed responses are only reported on /_metrics
+            response.call_on_close(lambda: finish(current, endpoint))
+            return response
+        g.pop('request_metrics', None)
+        wall_time = finish(current, endpoint)
+        response.headers['Server-Timing'] = (
+            f'app;dur={wall_time * 1000:.1f}, sql;dur={current["sql_time"] * 1000:.1f};desc="{current["sql_count"]} queries"'
+        )
+        response.headers['X-SQL-Count'] = str(current['sql_count'])
+        return response
+
+    @app.route('/_metrics')
+    def metrics_page():
+        """Shows the aggregated request metrics (?format=json for machine use, ?reset=1 to clear)."""
+        if request.args.get('reset'):
+            metrics.reset()
+        rows = metrics.snapshot()
+        if request.args.get('format') == 'json':
+            return jsonify(rows)
+        return render_template('metrics.html', rows=rows, sql_warn=metrics.sql_warn)
+
+    return metrics
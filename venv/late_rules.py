@@ -0,0 +1,177 @@
+# late_rules.py
+# Late-payment rules stored as data (society-wide or per wing) and bulk recomputation of Payment.is_late
+# Every rule reduces to one deadline per (year, month, wing), so history is re-flagged with set-based UPDATEs
+
+import datetime
+import calendar
+from models import db, Household, Payment, LatePaymentRule, Holiday
+from rollups import refresh_after_bulk_write
+
+LATE_PAYMENT_DAY = 21 # Default cut-off day when no society-wide rule has been saved
+MAX_GRACE_DAYS = 60
+LATE_MODE_CUTOFF_DAY = 'cutoff_day' # Late when paid after the cut-off day of the bill's month or any later month (original behaviour, the default)
+LATE_MODE_DEADLINE = 'deadline' # Late when paid after the bill month's deadline, whatever the day of the month
+LATE_MODES = {
+    LATE_MODE_CUTOFF_DAY: "After the cut-off day of the bill's month or a later month",
+    LATE_MODE_DEADLINE: "Any time after the bill month's deadline",
+}
+
+
+class LateRuleSet:
+    """The saved rules and holidays, resolved into payment deadlines."""
+
+    def __init__(self, rules, holidays):
+        self.default_rule = None
+        self.wing_rules = {} # wing -> LatePaymentRule
+        for rule in rules:
+            if rule.wing:
+                self.wing_rules[rule.wing] = rule
+            else:
+                self.default_rule = rule
+        self.holidays = set(holidays)
+        self._deadlines = {} # (year, month, wing) -> date
+
+    def rule_for(self, wing):
+        """Returns the rule that applies to a wing (falls back to the society-wide rule, which may be None)."""
+        return self.wing_rules.get(wing, self.default_rule)
+
+    def cutoff_day(self, wing=None):
+        """Returns: the rule's cut-off day of the month for a household in `wing` (no grace or holiday shift)."""
+        rule = self.rule_for(wing)
+        return rule.cutoff_day if rule else LATE_PAYMENT_DAY
+
+    def deadline(self, year, month, wing=None):
+        """Last day a payment for month/year counts as on time for a household in `wing`."""
+        key = (year, month, wing if wing in self.wing_rules else None)
+        if key not in self._deadlines:
+            rule = self.rule_for(key[2])
+            # A cut-off of 31 means the last day of shorter months
+            deadline = datetime.date(year, month, min(self.cutoff_day(key[2]), calendar.monthrange(year, month)[1]))
+            if rule:
+                deadline += datetime.timedelta(days=rule.grace_days or 0)
+                if rule.holiday_shift:
+                    while deadline.weekday() == 6 or deadline in self.holidays: # Sunday or listed holiday
+                        deadline += datetime.timedelta(days=1)
+            self._deadlines[key] = deadline
+        return self._deadlines[key]
+
+    def mode_for(self, wing):
+        rule = self.rule_for(wing if wing in self.wing_rules else None)
+        return rule.late_mode if rule and rule.late_mode else LATE_MODE_CUTOFF_DAY
+
+    def is_late(self, payment_date, month, year, wing=None):
+        """Checks whether a payment made on payment_date is late for the given payment month/year."""
+        if payment_date is None:
+            return False
+        # Paying a month in advance (or any time before the bill month's deadline) is never late
+        if payment_date <= self.deadline(year, month, wing):
+            return False
+        if self.mode_for(wing) == LATE_MODE_DEADLINE or (payment_date.year, payment_date.month) == (year, month):
+            return True
+        # Cut-off day mode, paid in a later month: late only after that month's plain cut-off day
+        # (e.g. a Feb bill paid on March 1st is not late, paid on March 22nd it is)
+        return payment_date.day > self.cutoff_day(wing)
+
+
+def load_late_rules():
+    """Loads all rules and holidays (two small queries). Returns: LateRuleSet"""
+    rules = db.session.scalars(db.select(LatePaymentRule)).all()
+    holidays = db.session.scalars(db.select(Holiday.holiday_date)).all()
+    return LateRuleSet(rules, holidays)
+
+
+def set_late_rule(wing, cutoff_day, grace_days=0, holiday_shift=False, late_mode=LATE_MODE_CUTOFF_DAY):
+    """
+    Creates or updates the rule for a wing (None = society-wide). Changes are added to the
+    session but not committed.
+    Returns: LatePaymentRule
+    """
+    wing = (wing or '').strip().upper() or None
+    if not 1 <= cutoff_day <= 31:
+        raise ValueError("Cut-off day must be between 1 and 31.")
+    if not 0 <= grace_days <= MAX_GRACE_DAYS:
+        raise ValueError(f"Grace period must be between 0 and {MAX_GRACE_DAYS} days.")
+    if late_mode not in LATE_MODES:
+        raise ValueError(f"Unknown late-payment mode '{late_mode}'.")
+    rule = db.session.scalars(db.select(LatePaymentRule).where(
+        LatePaymentRule.wing == wing if wing else LatePaymentRule.wing.is_(None)
+    )).first()
+    if rule is None:
+        rule = LatePaymentRule(wing=wing)
+        db.session.add(rule)
+    rule.cutoff_day = cutoff_day
+    rule.grace_days = grace_days
+    rule.holiday_shift = holiday_shift
+    rule.late_mode = late_mode
+    return rule
+
+
+def _next_month(year, month):
+    return datetime.date(year + month // 12, month % 12 + 1, 1)
+
+
+def recompute_late_flags(start_year=None, end_year=None, rules=None):
+    """
+    Re-evaluates Payment.is_late for every payment from start_year to end_year (default: all
+    years with payments) against the saved rules. Runs one UPDATE per rule group, executed for
+    all bill months at once, and only touches rows whose flag actually changes.
+    Does not commit.
+    Returns: number of payment records whose flag changed
+    """
+    if start_year is None or end_year is None:
+        first_year, last_year = db.session.execute(
+            db.select(db.func.min(Payment.payment_year), db.func.max(Payment.payment_year))
+        ).one()
+        if first_year is None:
+            return 0 # No payments yet
+        start_year = first_year if start_year is None else start_year
+        end_year = last_year if end_year is None else end_year
+    rules = rules or load_late_rules()
+    periods = [(year, month) for year in range(start_year, end_year + 1) for month in range(1, 13)]
+
+    payment_table = Payment.__table__
+    household_table = Household.__table__
+    in_years = payment_table.c.payment_year.between(start_year, end_year)
+    # Rule groups: wings with their own rule, then everyone else (the society-wide rule)
+    groups = [(wing, household_table.c.wing == wing) for wing in rules.wing_rules]
+    groups.append((None, db.or_(
+        household_table.c.wing.is_(None),
+        # Spelled out instead of NOT IN (...), which can't be expanded in an executemany
+        db.and_(db.true(), *(household_table.c.wing != wing for wing in rules.wing_rules))
+    )))
+
+    connection = db.session.connection()
+    # A payment without a date is never late
+    changed = connection.execute(db.update(payment_table).where(
+        in_years, payment_table.c.payment_date.is_(None), payment_table.c.is_late == db.true()
+    ).values(is_late=False)).rowcount or 0
+    for wing, wing_filter in groups:
+        in_group = payment_table.c.household_id.in_(db.select(household_table.c.id).where(wing_filter))
+        # One deadline per bill month (grace and holiday shift only ever move the bill month's own deadline)
+        late = payment_table.c.payment_date > db.bindparam('deadline', type_=db.Date)
+        if rules.mode_for(wing) != LATE_MODE_DEADLINE:
+            # Cut-off day mode: paid in a later month, only late after that month's plain cut-off day
+            late = db.and_(late, db.or_(
+                payment_table.c.payment_date < db.bindparam('next_month', type_=db.Date),
+                db.extract('day', payment_table.c.payment_date) > rules.cutoff_day(wing)
+            ))
+        late = db.case((late, True), else_=False)
+        stmt = db.update(payment_table).where(
+            in_group,
+            payment_table.c.payment_year == db.bindparam('year'),
+            payment_table.c.payment_month == db.bindparam('month'),
+            payment_table.c.payment_date.isnot(None),
+            payment_table.c.is_late != late
+        ).values(is_late=late)
+        params = [
+            {'year': year, 'month': month, 'deadline': rules.deadline(year, month, wing), 'next_month': _next_month(year, month)}
+            for year, month in periods
+        ]
+        changed += connection.execute(stmt, params).rowcount or 0
+
+    if changed:
+        household_ids = db.session.scalars(
+            db.select(Payment.household_id).where(Payment.payment_year.between(start_year, end_year)).distinct()
+        ).all()
+        refresh_after_bulk_write(periods, household_ids)
+    return changed
@@ -0,0 +1,126 @@
+# models.py
+# Defines the database structure using SQLAlchemy
+# --- Updated to add is_late flag ---
+
+from flask_sqlalchemy import SQLAlchemy
+import datetime
+
+# Initialize SQLAlchemy without attaching it to a specific Flask app yet
+# It will be attached in app.py
+db = SQLAlchemy()
+
+class Household(db.Model):
+    """Represents a household in the society."""
+    id = db.Column(db.Integer, primary_key=True)
+    flat_number = db.Column(db.String(20), nullable=False) # Removed unique=True, combined with wing for uniqueness check in app logic
+    wing = db.Column(db.String(10), nullable=True)
+    owner_renter_name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    # Relationship to payments (one household has many payments)
+    payments = db.relationship('Payment', backref='household', lazy=True, cascade="all, delete-orphan")
+
+    # Ensure unique combination of flat_number and wing
+    __table_args__ = (db.UniqueConstraint('flat_number', 'wing', name='_flat_wing_uc'),)
+
+
+    def __repr__(self):
+        return f'<Household {self.wing}-{self.flat_number}>'
+
+class Payment(db.Model):
+    """Represents a monthly maintenance payment record."""
+    id = db.Column(db.Integer, primary_key=True)
+    household_id = db.Column(db.Integer, db.ForeignKey('household.id'), nullable=False)
+    payment_month = db.Column(db.Integer, nullable=False) # e.g., 1 for January, 2 for February
+    payment_year = db.Column(db.Integer, nullable=False) # e.g., 2025
+    amount_paid = db.Column(db.Float, nullable=True) # Amount actually paid
+    expected_amount = db.Column(db.Float, nullable=True) # Expected amount for the month (optional)
+    payment_date = db.Column(db.Date, nullable=True) # Date the payment was made/recorded
+    status = db.Column(db.String(20), nullable=False, default='Pending') # e.g., 'Pending', 'Paid', 'Partial', 'Receipt Found'
+    receipt_id = db.Column(db.String(100), nullable=True) # UPI transaction ID or notes
+    notes = db.Column(db.Text, nullable=True) # Any additional notes
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    # --- New Field for Late Payment ---
+    is_late = db.Column(db.Boolean, default=False, nullable=False)
+
+    # Ensure a household can only have one payment record per month/year
+    # Indexes back the month views/rollup refreshes and the per-household history lookups
+    __table_args__ = (
+        db.UniqueConstraint('household_id', 'payment_month', 'payment_year', name='_household_month_year_uc'),
+        db.Index('ix_payment_year_month_status', 'payment_year', 'payment_month', 'status'),
+        db.Index('ix_payment_household_year_month', 'household_id', 'payment_year', 'payment_month'),
+    )
+
+    def __repr__(self):
+        late_marker = " (Late)" if self.is_late else ""
+        return f'<Payment HouseholdID:{self.household_id} {self.payment_year}-{self.payment_month} Status:{self.status}{late_marker}>'
+
+class ImportedChatMessage(db.Model):
+    """Records a chat attachment message already processed by a chat import (used to skip it on re-upload)."""
+    id = db.Column(db.Integer, primary_key=True)
+    message_hash = db.Column(db.String(64), nullable=False, unique=True, index=True) # SHA-256 of timestamp/sender/content
+    message_timestamp = db.Column(db.DateTime, nullable=True) # Timestamp of the message in the chat
+    imported_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportedChatMessage {self.message_hash[:12]} {self.message_timestamp}>'
+
+class MonthlyCollectionRollup(db.Model):
+    """Collection totals per month and wing, kept up to date from Payment changes (see rollups.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    payment_year = db.Column(db.Integer, nullable=False)
+    payment_month = db.Column(db.Integer, nullable=False)
+    wing = db.Column(db.String(10), nullable=False, default='') # '' for households without a wing (NULLs would never conflict in _rollup_month_wing_uc)
+    record_count = db.Column(db.Integer, nullable=False, default=0) # Payment records for the month (one per household)
+    expected_total = db.Column(db.Float, nullable=False, default=0.0) # Sum of expected amounts (where set)
+    paid_total = db.Column(db.Float, nullable=False, default=0.0) # Sum of amounts actually paid
+    outstanding_total = db.Column(db.Float, nullable=False, default=0.0) # Sum of max(expected - paid, 0) over records with an expected amount
+    paid_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    partial_count = db.Column(db.Integer, nullable=False, default=0)
+    receipt_found_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('payment_year', 'payment_month', 'wing', name='_rollup_month_wing_uc'),)
+
+    def __repr__(self):
+        return f'<MonthlyCollectionRollup {self.payment_year}-{self.payment_month} Wing:{self.wing} Paid:{self.paid_count}/{self.record_count}>'
+
+class HouseholdBalance(db.Model):
+    """Per-household payment totals across all months, kept up to date from Payment changes (see rollups.py)."""
+    household_id = db.Column(db.Integer, db.ForeignKey('household.id'), primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    unpaid_count = db.Column(db.Integer, nullable=False, default=0) # Months with any status other than 'Paid'
+    partial_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+    expected_total = db.Column(db.Float, nullable=False, default=0.0)
+    paid_total = db.Column(db.Float, nullable=False, default=0.0)
+    outstanding_total = db.Column(db.Float, nullable=False, default=0.0) # Sum of max(expected - paid, 0) over records with an expected amount
+    oldest_unpaid = db.Column(db.Integer, nullable=True) # Oldest unpaid month as YYYYMM
+    last_paid = db.Column(db.Integer, nullable=True) # Most recent paid month as YYYYMM
+
+    def __repr__(self):
+        return f'<HouseholdBalance HouseholdID:{self.household_id} Unpaid:{self.unpaid_count}>'
+
+class LatePaymentRule(db.Model):
+    """Late-payment cut-off for the whole society (wing NULL) or for one wing (see late_rules.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    wing = db.Column(db.String(10), nullable=True) # NULL = society-wide default; one rule per wing (checked in app logic)
+    cutoff_day = db.Column(db.Integer, nullable=False, default=21) # Payments after this day of the month are late
+    grace_days = db.Column(db.Integer, nullable=False, default=0) # Extra days allowed after the cut-off day
+    holiday_shift = db.Column(db.Boolean, nullable=False, default=False) # Move a deadline falling on a Sunday/holiday to the next working day
+    late_mode = db.Column(db.String(20), nullable=False, default='cutoff_day') # 'cutoff_day' or 'deadline' (see late_rules.LATE_MODES)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LatePaymentRule Wing:{self.wing or "*"} Day:{self.cutoff_day}+{self.grace_days}>'
+
+class Holiday(db.Model):
+    """A holiday used when shifting late-payment deadlines."""
+    id = db.Column(db.Integer, primary_key=True)
+    holiday_date = db.Column(db.Date, nullable=False, unique=True)
+    description = db.Column(db.String(100), nullable=True)
+
+    def __repr__(self):
+        return f'<Holiday {self.holiday_date} {self.description}>'
@@ -0,0 +1,340 @@
+# ocr.py
+# Receipt OCR: image pre-processing, text parsing, a content-addressed result cache
+# and a background job queue so OCR never runs inside a web request
+
+import os
+import io
+import re
+import json
+import hashlib
+import time
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+# pytesseract, Pillow and dateutil are imported inside the functions that use them, so the web
+# process only pays for them once OCR actually runs (usually only in the worker processes)
+
+# --- Constants ---
+OCR_MAX_DIMENSION = 1800 # Longest image side (pixels) passed to Tesseract; phone screenshots are downscaled to this
+OCR_CROP_THRESHOLD = 40 # Minimum grey-level difference from the background that counts as text
+OCR_CROP_MARGIN = 10 # Pixels kept around the detected text region
+OCR_CACHE_MAX_ENTRIES = 500 # Number of cached OCR results kept on disk before the oldest are evicted
+OCR_PENDING_TIMEOUT = 300 # Seconds after which a job marker with no result is treated as lost (e.g. worker restarted)
+# Checked in order when neither TESSERACT_CMD nor the PATH has a tesseract executable
+TESSERACT_DEFAULT_PATHS = (
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+    '/usr/local/bin/tesseract',
+    '/opt/homebrew/bin/tesseract',
+)
+
+# --- Regex Patterns for OCR Text (adjust patterns as needed) ---
+# Amount (look for ₹ symbol, handle commas)
+AMOUNT_REGEX = re.compile(r'₹\s?([\d,]+\.?\d*)')
+# UPI Transaction ID (look for specific keywords, case-insensitive)
+UPI_ID_REGEX = re.compile(r'UPI\s+(?:transaction|txn)\s+ID\s*[:\-]?\s*(\d+)', re.IGNORECASE)
+# Date (lines with month names - this is often tricky)
+DATE_REGEX = re.compile(r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2}\s*,?\s*\d{4}', re.IGNORECASE)
+# Image digests double as job IDs, so anything arriving from a URL is checked against this
+DIGEST_REGEX = re.compile(r'[0-9a-f]{64}\Z')
+
+
+def find_tesseract(configured=None):
+    """
+    Locates the Tesseract executable: an explicitly configured path (TESSERACT_CMD) first,
+    then the PATH, then the usual install locations.
+    Returns: path to the executable, or None if Tesseract isn't installed
+    """
+    if configured:
+        return shutil.which(configured)
+    found = shutil.which('tesseract')
+    if found:
+        return found
+    for path in TESSERACT_DEFAULT_PATHS:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def image_digest(image_bytes):
+    """Returns the SHA-256 hex digest used to identify an image in the cache and job queue."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def preprocess_image(img):
+    """
+    Prepares a receipt image for Tesseract: converts to grayscale, downscales large
+    screenshots and crops away the uniform background around the text region.
+    """
+    from PIL import Image, ImageChops
+    img = img.convert('L')
+    if max(img.size) > OCR_MAX_DIMENSION:
+        img.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.LANCZOS)
+
+    # Background colour is taken from the top-left corner (works for light and dark mode screenshots)
+    background = Image.new('L', img.size, img.getpixel((0, 0)))
+    mask = ImageChops.difference(img, background).point(lambda p: 255 if p > OCR_CROP_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if bbox:
+        left, top, right, bottom = bbox
+        img = img.crop((
+            max(left - OCR_CROP_MARGIN, 0),
+            max(top - OCR_CROP_MARGIN, 0),
+            min(right + OCR_CROP_MARGIN, img.width),
+            min(bottom + OCR_CROP_MARGIN, img.height)
+        ))
+    return img
+
+
+def parse_receipt_text(text):
+    """
+    Extracts amount, UPI transaction ID and date from OCR text.
+    Returns: dict with 'amount', 'receipt_id', 'date' (None if not found) and a list of 'warnings'
+    """
+    extracted_data = {'amount': None, 'receipt_id': None, 'date': None, 'warnings': []}
+
+    amount_match = AMOUNT_REGEX.search(text)
+    if amount_match:
+        amount_str = amount_match.group(1).replace(',', '') # Remove commas
+        try:
+            extracted_data['amount'] = f"{float(amount_str):.2f}" # Format as float string
+        except ValueError:
+            extracted_data['warnings'].append("OCR found amount pattern, but couldn't convert to number.")
+
+    upi_id_match = UPI_ID_REGEX.search(text)
+    if upi_id_match:
+        extracted_data['receipt_id'] = upi_id_match.group(1)
+
+    date_match = DATE_REGEX.search(text)
+    if date_match:
+        from dateutil.parser import parse as dateutil_parse # For flexible date parsing
+        try:
+            extracted_data['date'] = dateutil_parse(date_match.group(0)).strftime('%Y-%m-%d')
+        except (ValueError, OverflowError):
+            extracted_data['warnings'].append("OCR found date pattern, but couldn't parse it.")
+
+    return extracted_data
+
+
+def run_ocr(image_bytes, tesseract_cmd=None):
+    """
+    Pre-processes an image, runs Tesseract on it and parses the text.
+    Runs in a worker process, so failures are returned as {'error': message} rather than raised.
+    """
+    import pytesseract
+    from PIL import Image # Pillow library for image handling
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    try:
+        img = preprocess_image(Image.open(io.BytesIO(image_bytes)))
+        # Perform OCR - use 'eng' for English language
+        text = pytesseract.image_to_string(img, lang='eng')
+    except pytesseract.TesseractNotFoundError:
+        return {'error': "Tesseract executable not found. Check installation and PATH configuration."}
+    except Exception as ocr_err:
+        return {'error': str(ocr_err)}
+    return parse_receipt_text(text)
+
+
+def _future_result(future):
+    try:
+        return future.result()
+    except Exception as job_err: # e.g. the worker process died
+        return {'error': str(job_err)}
+
+
+class OcrResultCache:
+    """
+    On-disk cache of parsed OCR results keyed by image SHA-256 (one JSON file per image).
+    Shared by all worker processes; the least recently used entries are evicted beyond max_entries.
+    Jobs in flight are recorded as <digest>.pending and failed ones as <digest>.error, so any
+    web worker can report the status of a job submitted through another one.
+    """
+
+    def __init__(self, cache_dir, max_entries=OCR_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries # The directory is created on the first put()
+
+    def _path(self, digest, suffix='json'):
+        return os.path.join(self.cache_dir, f"{digest}.{suffix}")
+
+    def _write(self, path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path) # Atomic, so readers never see a partial file
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass # Never written, or already removed by another worker
+
+    def get(self, digest):
+        """Returns the cached result for an image digest, or None."""
+        if not DIGEST_REGEX.match(digest):
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            os.utime(path) # Mark as recently used
+            return data
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, data):
+        """Stores a result (clearing the job markers), evicting the least recently used entries if the cache is full."""
+        self._write(self._path(digest), data)
+        self._remove(self._path(digest, 'pending'))
+        self._remove(self._path(digest, 'error'))
+        self._evict()
+
+    def mark_pending(self, digest):
+        """Records that an OCR job for the image has been queued (clears an earlier failure)."""
+        self._write(self._path(digest, 'pending'), {'queued_at': time.time()})
+        self._remove(self._path(digest, 'error'))
+
+    def mark_failed(self, digest, error):
+        """Records a failed OCR job so every worker reports the error."""
+        self._write(self._path(digest, 'error'), {'error': error})
+        self._remove(self._path(digest, 'pending'))
+
+    def job_status(self, digest):
+        """
+        Looks up the job markers for an image without a cached result.
+        Returns: {'status': 'pending'}, {'status': 'error', 'error': message} or None if no job is known
+        """
+        if not DIGEST_REGEX.match(digest):
+            return None
+        try:
+            with open(self._path(digest, 'error'), 'r', encoding='utf-8') as f:
+                return {'status': 'error', 'error': json.load(f).get('error') or "OCR failed."}
+        except (OSError, ValueError):
+            pass
+        try:
+            queued_at = os.path.getmtime(self._path(digest, 'pending'))
+        except OSError:
+            return None
+        if time.time() - queued_at > OCR_PENDING_TIMEOUT:
+            return {'status': 'error', 'error': "OCR job did not finish. Please upload the image again."}
+        return {'status': 'pending'}
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json'):
+                entries.append(entry)
+            elif entry.name.endswith(('.pending', '.error')) and now - entry.stat().st_mtime > OCR_PENDING_TIMEOUT:
+                self._remove(entry.path) # Stale job markers
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            self._remove(entry.path) # May already be evicted by another worker
+
+
+class OcrJobQueue:
+    """
+    Runs OCR jobs on a local process pool. Jobs are identified by the image digest,
+    so the same screenshot submitted twice shares one job (or one cached result).
+    """
+
+    def __init__(self, cache, max_workers=None, tesseract_cmd=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.tesseract_cmd = tesseract_cmd
+        self._executor = None
+        self._jobs = {} # digest -> Future for jobs that are running or failed
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so importing the app never spawns worker processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, image_bytes):
+        """
+        Queues OCR for an image unless a result is cached or a job is already running.
+        Returns: (job_id, cached result or None)
+        """
+        digest = image_digest(image_bytes)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            return digest, cached
+        submitted = None
+        with self._lock:
+            future = self._jobs.get(digest)
+            if future is None or (future.done() and _future_result(future).get('error')):
+                self.cache.mark_pending(digest) # Lets the other web workers answer status polls
+                submitted = self._jobs[digest] = self._get_executor().submit(run_ocr, image_bytes, self.tesseract_cmd)
+        if submitted is not None:
+            # Outside the lock: a job that already finished runs the callback (which takes the lock) right here
+            submitted.add_done_callback(lambda f, digest=digest: self._job_done(digest, f))
+        return digest, None
+
+    def run_batch(self, images):
+        """
+        OCRs many images in parallel across the worker pool, using and filling the result cache.
+        `images` is an iterable of (key, image_bytes); only a few images per worker are held
+        in memory at a time, so it can be fed straight from a ZIP archive.
+        Yields: (key, result dict) in completion order; failures are yielded as {'error': message}
+        """
+        executor = self._get_executor()
+        window = (self.max_workers or os.cpu_count() or 1) * 2 # Images in flight at once
+        pending = {} # Future -> (key, digest)
+        for key, image_bytes in images:
+            digest = image_digest(image_bytes)
+            cached = self.cache.get(digest)
+            if cached is not None:
+                yield key, cached
+                continue
+            pending[executor.submit(run_ocr, image_bytes, self.tesseract_cmd)] = (key, digest)
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._collect(done, pending)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from self._collect(done, pending)
+
+    def _collect(self, done, pending):
+        for future in done:
+            key, digest = pending.pop(future)
+            data = _future_result(future)
+            if not data.get('error'):
+                self.cache.put(digest, data)
+            yield key, data
+
+    def _job_done(self, digest, future):
+        data = _future_result(future)
+        if data.get('error'):
+            self.cache.mark_failed(digest, data['error'])
+            return
+        self.cache.put(digest, data)
+        with self._lock:
+            self._jobs.pop(digest, None) # Result now lives in the cache
+
+    def status(self, job_id):
+        """
+        Returns: dict with 'status' ('pending', 'done', 'error' or 'unknown') and
+        'data' (parsed result) or 'error' (message)
+        """
+        if not DIGEST_REGEX.match(job_id):
+            return {'status': 'unknown'}
+        cached = self.cache.get(job_id) # Also finds jobs completed by another worker process
+        if cached is not None:
+            return {'status': 'done', 'data': cached}
+        with self._lock:
+            future = self._jobs.get(job_id)
+        if future is None:
+            # Submitted through another web worker: answer from the shared job markers
+            return self.cache.job_status(job_id) or {'status': 'unknown'}
+        if not future.done():
+            return {'status': 'pending'}
+        data = _future_result(future)
+        if data.get('error'):
+            return {'status': 'error', 'error': data['error']}
+        return {'status': 'done', 'data': data}
@@ -0,0 +1,270 @@
+# rollups.py
+# Incremental maintenance of the reporting tables (MonthlyCollectionRollup, HouseholdBalance)
+# Payment changes flushed through the ORM are picked up by session events; bulk SQL writes call refresh_after_bulk_write()
+
+import datetime
+from itertools import chain
+from sqlalchemy import event, inspect
+from models import db, Household, Payment, MonthlyCollectionRollup, HouseholdBalance
+
+ROLLUP_REFRESH_CHUNK = 300 # Keys per IN (...) list when refreshing rollups
+
+
+def _status_count(status):
+    return db.func.coalesce(db.func.sum(db.case((Payment.status == status, 1), else_=0)), 0)
+
+def _late_count():
+    return db.func.coalesce(db.func.sum(db.case((Payment.is_late == db.true(), 1), else_=0)), 0)
+
+def _outstanding_total():
+    # Per record, so an overpaid month doesn't hide another month's arrears; records without an expected amount add nothing
+    shortfall = Payment.expected_amount - db.func.coalesce(Payment.amount_paid, 0.0)
+    return db.func.coalesce(db.func.sum(db.case((shortfall > 0, shortfall), else_=0.0)), 0.0)
+
+def _period():
+    return Payment.payment_year * 100 + Payment.payment_month # YYYYMM
+
+def _rollup_wing():
+    # MonthlyCollectionRollup.wing is '' for households without a wing
+    return db.func.coalesce(Household.wing, '')
+
+
+def _month_rollup_select():
+    """SELECT producing MonthlyCollectionRollup rows (grouped by year, month and wing)."""
+    return db.select(
+        Payment.payment_year,
+        Payment.payment_month,
+        _rollup_wing(),
+        db.func.count(Payment.id),
+        db.func.coalesce(db.func.sum(Payment.expected_amount), 0.0),
+        db.func.coalesce(db.func.sum(Payment.amount_paid), 0.0),
+        _outstanding_total(),
+        _status_count('Paid'),
+        _status_count('Pending'),
+        _status_count('Partial'),
+        _status_count('Receipt Found'),
+        _late_count()
+    ).join(Household, Household.id == Payment.household_id).group_by(
+        Payment.payment_year, Payment.payment_month, _rollup_wing()
+    )
+
+MONTH_ROLLUP_COLUMNS = [
+    'payment_year', 'payment_month', 'wing', 'record_count', 'expected_total', 'paid_total', 'outstanding_total',
+    'paid_count', 'pending_count', 'partial_count', 'receipt_found_count', 'late_count'
+]
+
+
+def _household_balance_select():
+    """SELECT producing HouseholdBalance rows (grouped by household)."""
+    unpaid = Payment.status != 'Paid'
+    return db.select(
+        Payment.household_id,
+        db.func.count(Payment.id),
+        db.func.coalesce(db.func.sum(db.case((unpaid, 1), else_=0)), 0),
+        _status_count('Partial'),
+        _late_count(),
+        db.func.coalesce(db.func.sum(Payment.expected_amount), 0.0),
+        db.func.coalesce(db.func.sum(Payment.amount_paid), 0.0),
+        _outstanding_total(),
+        db.func.min(db.case((unpaid, _period()), else_=None)),
+        db.func.max(db.case((Payment.status == 'Paid', _period()), else_=None))
+    ).group_by(Payment.household_id)
+
+HOUSEHOLD_BALANCE_COLUMNS = [
+    'household_id', 'record_count', 'unpaid_count', 'partial_count', 'late_count',
+    'expected_total', 'paid_total', 'outstanding_total', 'oldest_unpaid', 'last_paid'
+]
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), ROLLUP_REFRESH_CHUNK):
+        yield items[start:start + ROLLUP_REFRESH_CHUNK]
+
+
+def _upsert_from_select(connection, table, columns, key_columns, select, in_range, still_present):
+    """
+    Writes the rows produced by `select` into `table`, updating the rows whose key already exists,
+    then removes the rows in range that `select` no longer produces (payments deleted or moved).
+    """
+    dialect = connection.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        # No ON CONFLICT: replace the rows instead
+        connection.execute(db.delete(table).where(in_range))
+        connection.execute(db.insert(table).from_select(columns, select))
+        return
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    # ON CONFLICT DO UPDATE: a concurrent refresh of the same rows updates them instead of failing on the unique key
+    stmt = dialect_insert(table).from_select(columns, select)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: stmt.excluded[column] for column in columns if column not in key_columns}
+    ))
+    connection.execute(db.delete(table).where(in_range, ~still_present))
+
+
+def refresh_rollups(connection, months=(), household_ids=()):
+    """
+    Recomputes the MonthlyCollectionRollup rows for the given (year, month) pairs and the
+    HouseholdBalance rows for the given household ids. Only the affected months/households
+    are read from the payment table (via its indexes).
+    """
+    rollup_table = MonthlyCollectionRollup.__table__
+    balance_table = HouseholdBalance.__table__
+    rollup_has_payments = db.select(Payment.id).join(Household, Household.id == Payment.household_id).where(
+        Payment.payment_year == rollup_table.c.payment_year,
+        Payment.payment_month == rollup_table.c.payment_month,
+        _rollup_wing() == rollup_table.c.wing
+    ).exists()
+    balance_has_payments = db.select(Payment.id).where(Payment.household_id == balance_table.c.household_id).exists()
+    for chunk in _chunks(months):
+        _upsert_from_select(
+            connection, rollup_table, MONTH_ROLLUP_COLUMNS, ['payment_year', 'payment_month', 'wing'],
+            _month_rollup_select().where(db.tuple_(Payment.payment_year, Payment.payment_month).in_(chunk)),
+            db.tuple_(rollup_table.c.payment_year, rollup_table.c.payment_month).in_(chunk),
+            rollup_has_payments
+        )
+    for chunk in _chunks(household_ids):
+        _upsert_from_select(
+            connection, balance_table, HOUSEHOLD_BALANCE_COLUMNS, ['household_id'],
+            _household_balance_select().where(Payment.household_id.in_(chunk)),
+            balance_table.c.household_id.in_(chunk),
+            balance_has_payments
+        )
+
+
+def refresh_after_bulk_write(months=(), household_ids=()):
+    """
+    Refreshes the rollups after Payment rows were written with bulk statements (executemany
+    INSERT/UPDATE, INSERT ... SELECT, UPDATE ... WHERE) in the current session's transaction.
+    Those bypass the flush events, so every bulk writer calls this once its statements have run.
+    """
+    refresh_rollups(db.session.connection(), months, household_ids)
+
+
+def rebuild_rollups(connection):
+    """Rebuilds both reporting tables from the full payment history (used by db-init / rollups-rebuild)."""
+    connection.execute(db.delete(MonthlyCollectionRollup.__table__))
+    connection.execute(db.insert(MonthlyCollectionRollup.__table__).from_select(MONTH_ROLLUP_COLUMNS, _month_rollup_select()))
+    connection.execute(db.delete(HouseholdBalance.__table__))
+    connection.execute(db.insert(HouseholdBalance.__table__).from_select(HOUSEHOLD_BALANCE_COLUMNS, _household_balance_select()))
+
+
+# --- Session Events ---
+def _attribute_values(obj, attr):
+    """Current value of an attribute plus any value it had before this flush."""
+    history = inspect(obj).attrs[attr].history
+    values = set(history.added) | set(history.unchanged) | set(history.deleted)
+    return values or {getattr(obj, attr)}
+
+def _collect_rollup_changes(session, flush_context, instances):
+    """before_flush: remembers which months/households are touched by pending Payment/Household changes."""
+    months = session.info.setdefault('rollup_months', set())
+    household_ids = session.info.setdefault('rollup_households', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Payment):
+            for year in _attribute_values(obj, 'payment_year'):
+                for month in _attribute_values(obj, 'payment_month'):
+                    months.add((year, month))
+            household_ids.update(_attribute_values(obj, 'household_id'))
+        elif isinstance(obj, Household) and obj.id is not None:
+            deleted = obj in session.deleted
+            if deleted or inspect(obj).attrs.wing.history.has_changes():
+                # A wing change moves all of the household's months between wing rollups
+                months.update(session.connection().execute(
+                    db.select(Payment.payment_year, Payment.payment_month).where(Payment.household_id == obj.id).distinct()
+                ).tuples())
+            if deleted:
+                session.connection().execute(
+                    db.delete(HouseholdBalance.__table__).where(HouseholdBalance.__table__.c.household_id == obj.id)
+                )
+    months.discard((None, None))
+    household_ids.discard(None)
+
+def _apply_rollup_changes(session, flush_context):
+    """after_flush: refreshes the rollups for everything the flush touched (same transaction)."""
+    months = session.info.pop('rollup_months', set())
+    household_ids = session.info.pop('rollup_households', set())
+    if months or household_ids:
+        refresh_rollups(session.connection(), months, household_ids)
+
+def _discard_rollup_changes(session, previous_transaction):
+    session.info.pop('rollup_months', None)
+    session.info.pop('rollup_households', None)
+
+
+def init_rollups(session):
+    """Registers the session events that keep the reporting tables current."""
+    if not event.contains(session, 'before_flush', _collect_rollup_changes):
+        event.listen(session, 'before_flush', _collect_rollup_changes)
+        event.listen(session, 'after_flush', _apply_rollup_changes)
+        event.listen(session, 'after_soft_rollback', _discard_rollup_changes)
+
+
+# --- Reports (read only from the rollup tables) ---
+def collection_by_month(periods):
+    """
+    Returns per-month totals (all wings) and per-wing totals over the given (year, month) periods.
+    Returns: (month_rows, wing_rows) - lists of row mappings
+    """
+    r = MonthlyCollectionRollup
+    in_window = db.tuple_(r.payment_year, r.payment_month).in_(periods)
+    totals = [
+        db.func.sum(r.record_count).label('record_count'),
+        db.func.sum(r.expected_total).label('expected_total'),
+        db.func.sum(r.paid_total).label('paid_total'),
+        db.func.sum(r.outstanding_total).label('outstanding_total'),
+        db.func.sum(r.paid_count).label('paid_count'),
+        db.func.sum(r.pending_count).label('pending_count'),
+        db.func.sum(r.partial_count).label('partial_count'),
+        db.func.sum(r.receipt_found_count).label('receipt_found_count'),
+        db.func.sum(r.late_count).label('late_count'),
+    ]
+    month_rows = db.session.execute(
+        db.select(r.payment_year, r.payment_month, *totals).where(in_window)
+        .group_by(r.payment_year, r.payment_month).order_by(r.payment_year, r.payment_month)
+    ).mappings().all()
+    wing_rows = db.session.execute(
+        db.select(r.wing, *totals).where(in_window).group_by(r.wing).order_by(r.wing)
+    ).mappings().all()
+    return month_rows, wing_rows
+
+
+def defaulters(rules, min_unpaid_months=1, today=None):
+    """
+    Returns households with at least min_unpaid_months unpaid months whose payment deadline (per
+    `rules`, a LateRuleSet) has passed, worst first. HouseholdBalance covers every record, so the few
+    not yet due - the current month before its deadline and future months already created - are
+    read separately (one small indexed query) and subtracted.
+    Returns: list of (household, balance, overdue months, overdue amount)
+    """
+    today = today or datetime.date.today()
+    current = today.year * 100 + today.month
+    # Wings whose deadline for the current month is still ahead (the rest follow the society-wide rule)
+    open_wings = [wing for wing in rules.wing_rules if rules.deadline(today.year, today.month, wing) >= today]
+    default_open = rules.deadline(today.year, today.month) >= today
+    current_open = db.or_(
+        Household.wing.in_(open_wings),
+        db.or_(Household.wing.is_(None), Household.wing.notin_(list(rules.wing_rules))) if default_open else db.false()
+    )
+    not_due = db.select(
+        Payment.household_id,
+        db.func.coalesce(db.func.sum(db.case((Payment.status != 'Paid', 1), else_=0)), 0).label('unpaid_count'),
+        _outstanding_total().label('outstanding_total')
+    ).join(Household, Household.id == Payment.household_id).where(
+        Payment.payment_year >= today.year,
+        db.or_(_period() > current, db.and_(_period() == current, current_open))
+    ).group_by(Payment.household_id).subquery()
+
+    overdue_months = (HouseholdBalance.unpaid_count - db.func.coalesce(not_due.c.unpaid_count, 0)).label('overdue_months')
+    overdue_amount = (HouseholdBalance.outstanding_total - db.func.coalesce(not_due.c.outstanding_total, 0.0)).label('overdue_amount')
+    return db.session.execute(
+        db.select(Household, HouseholdBalance, overdue_months, overdue_amount)
+        .join(HouseholdBalance, HouseholdBalance.household_id == Household.id)
+        .outerjoin(not_due, not_due.c.household_id == Household.id)
+        .where(overdue_months >= min_unpaid_months)
+        .order_by(overdue_months.desc(), overdue_amount.desc(), Household.wing, Household.flat_number)
+    ).tuples().all()
@@ -0,0 +1,115 @@
+# synthetic.py
+# Synthetic society data for benchmarks: households, years of payment history and WhatsApp chat exports
+# Everything is generated from a seed, so benchmark runs are repeatable
+
+import random
+import datetime
+from models import db, Household, Payment
+from late_rules import load_late_rules
+from rollups import rebuild_rollups
+
+SYNTHETIC_BATCH_SIZE = 5000 # Rows per executemany INSERT
+FLATS_PER_FLOOR = 4 # Flat numbers run 101-104, 201-204, ...
+MAINTENANCE_AMOUNT = 1500.0
+SENDER_NAMES = ['Asha', 'Rahul', 'Priya', 'Vikram', 'Neha', 'Suresh', 'Kavita', 'Imran', 'Meera', 'Arjun']
+# Caption styles seen in real groups; {w} = wing, {f} = flat number
+CAPTION_TEMPLATES = [
+    '{w}-{f}', '{w} {f} paid', 'Flat {f} Wing {w}', 'flat no {f} {w} wing', '{w}{f} maintenance',
+    'Payment for {f} {w}', 'Wing: {w} Flat: {f}', 'maintenance {w}/{f} done',
+]
+CHAT_TEXT_MESSAGES = [
+    'Good morning everyone', 'Water supply will be off tomorrow 10-12', 'Thanks', 'Noted',
+    'Lift is under maintenance today', 'Please pay before the 21st', 'Meeting on Sunday at 6 pm',
+]
+
+
+def flat_numbers(flats_per_wing):
+    """Returns the flat numbers for one wing ('101', '102', ... by floor)."""
+    return [str((i // FLATS_PER_FLOOR + 1) * 100 + i % FLATS_PER_FLOOR + 1) for i in range(flats_per_wing)]
+
+def wing_names(wings):
+    return [chr(ord('A') + i) for i in range(wings)]
+
+
+def generate_society(wings, flats_per_wing, years, end_year=None, seed=0, paid_ratio=0.85):
+    """
+    Inserts wings x flats_per_wing households and `years` years of monthly payment history
+    (ending with end_year, default: last year) using batched executemany INSERTs, then rebuilds
+    the rollups. Payment dates are spread around the cut-off so some payments are late.
+    Returns: (households created, payment records created)
+    """
+    rng = random.Random(seed)
+    end_year = end_year or datetime.date.today().year - 1
+    db.session.execute(db.insert(Household), [
+        {'flat_number': flat_number, 'wing': wing, 'owner_renter_name': f"{rng.choice(SENDER_NAMES)} {wing}{flat_number}"}
+        for wing in wing_names(wings) for flat_number in flat_numbers(flats_per_wing)
+    ])
+    households = db.session.execute(db.select(Household.id, Household.wing)).all()
+    late_rules = load_late_rules()
+
+    created = 0
+    batch = []
+    for household_id, wing in households:
+        for year in range(end_year - years + 1, end_year + 1):
+            for month in range(1, 13):
+                roll = rng.random()
+                if roll < paid_ratio:
+                    payment_date = datetime.date(year, month, 1) + datetime.timedelta(days=rng.randint(-3, 35))
+                    row = {'status': 'Paid', 'amount_paid': MAINTENANCE_AMOUNT, 'payment_date': payment_date,
+                           'receipt_id': str(rng.randrange(10**11, 10**12)),
+                           'is_late': late_rules.is_late(payment_date, month, year, wing)}
+                elif roll < paid_ratio + (1 - paid_ratio) / 3:
+                    row = {'status': 'Partial', 'amount_paid': MAINTENANCE_AMOUNT / 2, 'payment_date': None, 'receipt_id': None, 'is_late': False}
+                else:
+                    row = {'status': 'Pending', 'amount_paid': None, 'payment_date': None, 'receipt_id': None, 'is_late': False}
+                row.update(household_id=household_id, payment_month=month, payment_year=year, expected_amount=MAINTENANCE_AMOUNT)
+                batch.append(row)
+                if len(batch) >= SYNTHETIC_BATCH_SIZE:
+                    db.session.execute(db.insert(Payment).execution_options(render_nulls=True), batch)
+                    created += len(batch)
+                    batch = []
+    if batch:
+        db.session.execute(db.insert(Payment).execution_options(render_nulls=True), batch)
+        created += len(batch)
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    return len(households), created
+
+
+def iter_chat_export(messages, wings, flats_per_wing, start=None, seed=0, receipt_ratio=0.4, unknown_ratio=0.05):
+    """
+    Yields the lines of a synthetic WhatsApp export ("dd/mm/yy, h:mm am - Sender: text") with
+    `messages` messages. About receipt_ratio of them are receipt screenshots with a flat/wing
+    caption (unknown_ratio of those name a flat that doesn't exist); the rest are chatter,
+    some spanning several lines.
+    """
+    rng = random.Random(seed)
+    timestamp = start or datetime.datetime(datetime.date.today().year - 1, 1, 1, 8, 0)
+    wing_list = wing_names(wings)
+    flat_list = flat_numbers(flats_per_wing)
+    for index in range(messages):
+        timestamp += datetime.timedelta(minutes=rng.randint(1, 240))
+        hour = timestamp.hour % 12 or 12
+        prefix = f"{timestamp:%d/%m/%y}, {hour}:{timestamp:%M} {'am' if timestamp.hour < 12 else 'pm'} - {rng.choice(SENDER_NAMES)}: "
+        if rng.random() < receipt_ratio:
+            if rng.random() < unknown_ratio:
+                wing, flat_number = 'Z', '999' # No such household
+            else:
+                wing, flat_number = rng.choice(wing_list), rng.choice(flat_list)
+            caption = rng.choice(CAPTION_TEMPLATES).format(w=wing, f=flat_number)
+            yield f"{prefix}IMG-{timestamp:%Y%m%d}-WA{index:04d}.jpg (file attached)\n"
+            yield f"{caption}\n"
+        else:
+            yield f"{prefix}{rng.choice(CHAT_TEXT_MESSAGES)}\n"
+            if rng.random() < 0.1:
+                yield "(continued) please check the notice board\n"
+
+
+def write_chat_export(path, messages, wings, flats_per_wing, seed=0):
+    """Writes a synthetic chat export to `path`. Returns: number of lines written"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in iter_chat_export(messages, wings, flats_per_wing, seed=seed):
+            f.write(line)
+            count += 1
+    return count
@@ -0,0 +1,32 @@
+# conftest.py
+# Shared pytest fixtures: an app on a throwaway SQLite database per test
+# Run from the app folder: python -m pytest tests
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # The app modules live one level up
+
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'OCR_CACHE_DIR': str(tmp_path / 'ocr_cache'),
+        'RECEIPT_BATCH_DIR': str(tmp_path / 'receipt_batches'),
+    })
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,134 @@
+# test_late_rules.py
+# Late-payment modes, and the bulk recompute (SQL) agreeing with LateRuleSet.is_late (Python)
+
+import random
+import datetime
+import pytest
+from models import db, Household, Payment, Holiday
+from late_rules import LATE_MODE_CUTOFF_DAY, LATE_MODE_DEADLINE, LateRuleSet, load_late_rules, set_late_rule, recompute_late_flags
+
+D = datetime.date
+
+
+def rule_set(*rules, holidays=()):
+    """Builds a LateRuleSet from (wing, cutoff_day, grace_days, holiday_shift, late_mode) tuples without a database."""
+    class Rule:
+        def __init__(self, wing, cutoff_day, grace_days, holiday_shift, late_mode):
+            self.wing, self.cutoff_day, self.grace_days, self.holiday_shift, self.late_mode = wing, cutoff_day, grace_days, holiday_shift, late_mode
+    return LateRuleSet([Rule(*rule) for rule in rules], holidays)
+
+
+# --- Modes ---
+def test_default_rule_is_day_21_of_the_bill_or_a_later_month():
+    rules = rule_set()
+    assert not rules.is_late(D(2025, 2, 21), 2, 2025)
+    assert rules.is_late(D(2025, 2, 22), 2, 2025)
+    assert not rules.is_late(D(2025, 3, 1), 2, 2025) # Feb bill paid on March 1st
+    assert rules.is_late(D(2025, 3, 22), 2, 2025)
+    assert not rules.is_late(D(2025, 1, 28), 2, 2025) # Paid in advance
+    assert not rules.is_late(None, 2, 2025)
+
+
+def test_cutoff_mode_grace_only_moves_the_bill_months_deadline():
+    rules = rule_set((None, 25, 10, False, LATE_MODE_CUTOFF_DAY))
+    assert rules.deadline(2025, 1) == D(2025, 2, 4)
+    assert not rules.is_late(D(2025, 1, 30), 1, 2025)
+    assert not rules.is_late(D(2025, 2, 4), 1, 2025)
+    assert not rules.is_late(D(2025, 2, 20), 1, 2025) # Past the deadline, but before February's cut-off
+    assert rules.is_late(D(2025, 2, 26), 1, 2025)
+    assert rules.is_late(D(2025, 3, 30), 1, 2025)
+    assert rules.is_late(D(2025, 6, 29), 1, 2025)
+
+
+def test_deadline_mode_is_late_any_time_after_the_bill_months_deadline():
+    rules = rule_set((None, 10, 5, False, LATE_MODE_DEADLINE))
+    assert not rules.is_late(D(2025, 3, 15), 3, 2025)
+    assert rules.is_late(D(2025, 3, 16), 3, 2025)
+    assert rules.is_late(D(2025, 4, 2), 3, 2025) # Day 2 of a later month is still late
+    assert not rules.is_late(D(2025, 2, 28), 3, 2025)
+
+
+def test_holiday_shift_skips_sundays_and_holidays():
+    # 2025-06-21 is a Saturday (holiday), 06-22 a Sunday
+    rules = rule_set((None, 21, 0, True, LATE_MODE_DEADLINE), holidays=[D(2025, 6, 21)])
+    assert rules.deadline(2025, 6) == D(2025, 6, 23)
+    assert not rules.is_late(D(2025, 6, 23), 6, 2025)
+    assert rules.is_late(D(2025, 6, 24), 6, 2025)
+
+
+def test_cutoff_31_means_the_last_day_of_shorter_months():
+    rules = rule_set((None, 31, 0, False, LATE_MODE_CUTOFF_DAY))
+    assert rules.deadline(2025, 2) == D(2025, 2, 28)
+    assert not rules.is_late(D(2025, 4, 30), 2, 2025)
+
+
+def test_wing_rule_overrides_the_society_wide_rule():
+    rules = rule_set((None, 21, 0, False, LATE_MODE_CUTOFF_DAY), ('A', 5, 0, False, LATE_MODE_DEADLINE))
+    assert rules.is_late(D(2025, 3, 6), 3, 2025, 'A')
+    assert not rules.is_late(D(2025, 3, 6), 3, 2025, 'B')
+    assert not rules.is_late(D(2025, 3, 6), 3, 2025)
+
+
+def test_set_late_rule_rejects_bad_values(app):
+    with pytest.raises(ValueError):
+        set_late_rule(None, 32)
+    with pytest.raises(ValueError):
+        set_late_rule(None, 21, grace_days=61)
+    with pytest.raises(ValueError):
+        set_late_rule(None, 21, late_mode='weekly')
+
+
+# --- Bulk recompute agrees with is_late ---
+RULE_CASES = {
+    'default': [],
+    'grace past month end': [(None, 25, 10, False, LATE_MODE_CUTOFF_DAY)],
+    'holiday shift': [(None, 21, 3, True, LATE_MODE_CUTOFF_DAY)],
+    'deadline mode': [(None, 15, 20, True, LATE_MODE_DEADLINE)],
+    'mixed wings': [
+        (None, 25, 10, True, LATE_MODE_CUTOFF_DAY),
+        ('A', 10, 3, False, LATE_MODE_DEADLINE),
+        ('B', 31, 45, True, LATE_MODE_CUTOFF_DAY),
+    ],
+}
+
+
+def add_payment_history(seed=0):
+    """Adds households in wings A, B, C and none, with payments made from well before to months after their bill month."""
+    rng = random.Random(seed)
+    households = [Household(flat_number=str(100 + n), wing=wing, owner_renter_name=f"Owner {n}")
+                  for n, wing in enumerate(['A', 'A', 'B', 'B', 'C', None])]
+    db.session.add_all(households)
+    db.session.flush()
+    for household in households:
+        for year in (2024, 2025):
+            for month in range(1, 13):
+                paid = rng.random() < 0.9
+                db.session.add(Payment(
+                    household_id=household.id, payment_month=month, payment_year=year,
+                    status='Paid' if paid else 'Pending', amount_paid=1000.0 if paid else None,
+                    payment_date=D(year, month, 1) + datetime.timedelta(days=rng.randint(-20, 200)) if paid else None,
+                    is_late=rng.random() < 0.5 # Arbitrary starting flags, so the recompute has to fix them
+                ))
+    db.session.add_all([Holiday(holiday_date=day, description='Holiday') for day in (D(2024, 8, 15), D(2025, 1, 26), D(2025, 3, 24))])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('rules', RULE_CASES.values(), ids=RULE_CASES.keys())
+def test_recompute_matches_is_late(app, rules):
+    add_payment_history()
+    for wing, cutoff_day, grace_days, holiday_shift, late_mode in rules:
+        set_late_rule(wing, cutoff_day, grace_days, holiday_shift, late_mode)
+    db.session.commit()
+    late_rules = load_late_rules()
+    rows = db.session.execute(db.select(Payment, Household.wing).join(Household)).all()
+    expected = {payment.id: late_rules.is_late(payment.payment_date, payment.payment_month, payment.payment_year, wing) for payment, wing in rows}
+    wrong_before = sum(payment.is_late != expected[payment.id] for payment, _ in rows)
+
+    changed = recompute_late_flags()
+    db.session.commit()
+
+    flags = dict(db.session.execute(db.select(Payment.id, Payment.is_late)).tuples().all())
+    mismatches = {payment_id for payment_id, is_late in expected.items() if flags[payment_id] != is_late}
+    assert not mismatches
+    assert changed == wrong_before
+    assert recompute_late_flags() == 0 # Nothing left to change
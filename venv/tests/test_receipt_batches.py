@@ -0,0 +1,90 @@
+# test_receipt_batches.py
+# "Export with media" ZIP uploads: OCR runs as a background job and the review page polls for the proposals
+
+import io
+import time
+import zipfile
+import datetime
+import pytest
+from models import db, Household, Payment
+
+CHAT = (
+    "05/03/2025, 10:00 - Asha: IMG-20250305-WA0001.jpg (file attached)\n"
+    "A-101 march\n"
+    "06/03/2025, 11:00 - Bala: IMG-20250306-WA0002.jpg (file attached)\n"
+    "Z-999 march\n"
+)
+
+
+class FakeOcrQueue:
+    """Stands in for OcrJobQueue.run_batch (Tesseract is not needed to test the batch flow)."""
+
+    def run_batch(self, images):
+        for key, _ in images:
+            yield key, {'amount': 2500.0, 'receipt_id': '4242', 'date': '2025-03-25', 'warnings': []}
+
+
+def zip_upload(chat=CHAT):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('WhatsApp Chat with Society/_chat.txt', chat)
+        archive.writestr('WhatsApp Chat with Society/IMG-20250305-WA0001.jpg', b'receipt one')
+        archive.writestr('WhatsApp Chat with Society/IMG-20250306-WA0002.jpg', b'receipt two')
+    buffer.seek(0)
+    return {'chatzip': (buffer, 'export.zip')}
+
+
+def wait_for_batch(client, batch_url):
+    status_url = batch_url.replace('/receipt_batch/', '/receipt_batch_status/')
+    for _ in range(100):
+        status = client.get(status_url).get_json()['status']
+        if status != 'pending':
+            return status
+        time.sleep(0.05)
+    pytest.fail("Receipt batch did not finish")
+
+
+@pytest.fixture
+def batches(app):
+    app.extensions['receipt_batches'].ocr_queue = FakeOcrQueue()
+    household = Household(flat_number='101', wing='A', owner_renter_name='Asha')
+    db.session.add(household)
+    db.session.commit()
+    return household
+
+
+def test_upload_queues_batch_and_review_page_lists_proposals(client, batches):
+    response = client.post('/upload_chat_zip', data=zip_upload(), content_type='multipart/form-data')
+    assert response.status_code == 302
+    batch_url = response.headers['Location']
+    assert wait_for_batch(client, batch_url) == 'done'
+
+    page = client.get(batch_url).get_data(as_text=True)
+    assert "Review Receipts from 'export.zip'" in page
+    assert 'value="2500.0"' in page and 'value="2025-03-25"' in page # OCR values pre-filled
+    assert '1 receipt images could not be matched' in page # Z-999 is not a household
+    assert 'receipt_batch_status' not in page # No more polling once the proposals are shown
+
+    batch_id = batch_url.rsplit('/', 1)[-1]
+    response = client.post('/apply_receipt_batch', data={
+        'batch_id': batch_id, 'selected': '0', 'household_id-0': batches.id, 'month-0': 3, 'year-0': 2025,
+        'amount-0': '2500', 'receipt_id-0': '4242', 'payment_date-0': '2025-03-25'
+    })
+    assert response.status_code == 302
+    payment = db.session.scalars(db.select(Payment)).one()
+    assert (payment.status, payment.amount_paid, payment.payment_date, payment.is_late) == ('Paid', 2500.0, datetime.date(2025, 3, 25), True)
+    assert client.get(batch_url).status_code == 302 # Applied batches are discarded
+
+
+def test_failed_batch_is_reported(client, batches):
+    response = client.post('/upload_chat_zip', data={'chatzip': (io.BytesIO(b'not a zip'), 'export.zip')}, content_type='multipart/form-data')
+    batch_url = response.headers['Location']
+    assert wait_for_batch(client, batch_url) == 'error'
+    response = client.get(batch_url, follow_redirects=True)
+    assert b'An error occurred processing file' in response.data
+
+
+def test_unknown_batch(client):
+    assert client.get('/receipt_batch_status/' + 'a' * 32).status_code == 404
+    assert client.get('/receipt_batch_status/../../etc').status_code == 404
+    assert client.get('/receipt_batch/' + 'a' * 32).status_code == 302
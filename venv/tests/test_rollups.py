@@ -0,0 +1,141 @@
+# test_rollups.py
+# After every write path, the incrementally maintained rollups must match a full rebuild_rollups()
+
+import io
+import datetime
+import pytest
+from models import db, Household, Payment, MonthlyCollectionRollup, HouseholdBalance
+from rollups import rebuild_rollups, refresh_rollups, defaulters
+from helpers import ensure_payment_records
+from chat_import import import_chat, apply_receipt_batch
+from bulk_io import read_rows, import_rows
+from late_rules import load_late_rules, set_late_rule, recompute_late_flags
+
+D = datetime.date
+
+
+def rollup_snapshot():
+    """Returns: both rollup tables as sorted lists of row tuples (without surrogate ids)."""
+    month_columns = [column for column in MonthlyCollectionRollup.__table__.c if column.name != 'id']
+    return (
+        sorted(db.session.execute(db.select(*month_columns)).tuples().all()),
+        sorted(db.session.execute(db.select(*HouseholdBalance.__table__.c)).tuples().all(), key=repr),
+    )
+
+
+def assert_rollups_match_rebuild():
+    db.session.commit()
+    incremental = rollup_snapshot()
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    assert incremental == rollup_snapshot()
+
+
+@pytest.fixture
+def society(app):
+    """Three households (one without a wing) with a few months of mixed payments."""
+    households = [
+        Household(flat_number='101', wing='A', owner_renter_name='Asha'),
+        Household(flat_number='102', wing='B', owner_renter_name='Bala'),
+        Household(flat_number='7', wing=None, owner_renter_name='Chitra'),
+    ]
+    db.session.add_all(households)
+    db.session.flush()
+    for index, household in enumerate(households):
+        for month in (1, 2, 3):
+            paid = (index + month) % 3 != 0
+            db.session.add(Payment(
+                household_id=household.id, payment_month=month, payment_year=2025,
+                status='Paid' if paid else 'Pending', amount_paid=1500.0 if paid else None, expected_amount=2000.0,
+                payment_date=D(2025, month, 10 + 7 * index) if paid else None, is_late=False
+            ))
+    db.session.commit()
+    return households
+
+
+def test_orm_changes(society):
+    payment = db.session.scalars(db.select(Payment).where(Payment.status == 'Pending')).first()
+    payment.status, payment.amount_paid, payment.payment_date = 'Paid', 2000.0, D(2025, 4, 2)
+    db.session.commit()
+    assert_rollups_match_rebuild()
+
+    society[0].wing = 'C' # Moves every month of the household to another wing's rollup row
+    db.session.commit()
+    assert_rollups_match_rebuild()
+
+    db.session.delete(society[1])
+    db.session.commit()
+    assert_rollups_match_rebuild()
+
+
+def test_record_payment_route(client, society):
+    response = client.post(f'/record_payment/{society[2].id}/2025/6', data={
+        'amount_paid': '2000', 'payment_date': '2025-06-25', 'status': 'Paid', 'receipt_id': 'R1', 'notes': ''
+    })
+    assert response.status_code == 302
+    assert_rollups_match_rebuild()
+
+
+def test_ensure_payment_records(society):
+    assert ensure_payment_records(5, 2025) == len(society)
+    assert_rollups_match_rebuild()
+
+
+def test_chat_import(society):
+    lines = [
+        "01/02/2025, 10:00 - Asha: IMG-20250201-WA0001.jpg (file attached)",
+        "A-101 feb",
+        "05/06/2025, 09:30 - Chitra: IMG-20250605-WA0002.jpg (file attached)",
+        "flat 7 june",
+    ]
+    result = import_chat(lines)
+    assert not result.errors and len(result.found_receipts) == 2
+    assert_rollups_match_rebuild()
+
+
+def test_receipt_batch(society):
+    apply_receipt_batch([
+        {'household_id': society[0].id, 'month': 3, 'year': 2025, 'amount': 2000.0, 'receipt_id': 'X', 'payment_date': D(2025, 3, 30), 'is_late': True},
+        {'household_id': society[1].id, 'month': 7, 'year': 2025, 'amount': 2000.0, 'receipt_id': 'Y', 'payment_date': D(2025, 7, 1), 'is_late': False},
+    ])
+    assert_rollups_match_rebuild()
+
+
+def test_bulk_import(society):
+    csv_text = (
+        "wing,flat_number,owner_renter_name,payment_year,payment_month,status,amount_paid,expected_amount,payment_date,receipt_id,is_late,notes\n"
+        "A,101,,2025,1,Partial,500,2000,2025-01-28,,,\n"
+        "D,401,Devi,2025,2,Paid,2000,2000,2025-02-05,R9,,\n"
+        ",7,,2025,8,Pending,,2000,,,,\n"
+    )
+    result = import_rows(read_rows(io.BytesIO(csv_text.encode()), 'payments.csv'), load_late_rules().is_late)
+    assert not result.errors and result.payments_created == 2 and result.payments_updated == 1
+    assert_rollups_match_rebuild()
+
+
+def test_recompute_late_flags(society):
+    set_late_rule(None, 5, 0, False)
+    set_late_rule('B', 25, 10, True)
+    db.session.flush()
+    assert recompute_late_flags() > 0
+    assert_rollups_match_rebuild()
+
+
+def test_refresh_updates_existing_rows_in_place(society):
+    before = rollup_snapshot()
+    connection = db.session.connection()
+    refresh_rollups(connection, [(2025, 1), (2025, 2), (2025, 3)], [household.id for household in society])
+    refresh_rollups(connection, [(2025, 1)], [society[0].id]) # Same rows again in one transaction
+    db.session.commit()
+    assert rollup_snapshot() == before
+    assert db.session.scalar(db.select(db.func.count()).select_from(MonthlyCollectionRollup).where(MonthlyCollectionRollup.wing == '')) == 3
+
+
+def test_defaulters_skip_months_not_yet_due(society):
+    ensure_payment_records(4, 2025)
+    db.session.commit()
+    rules = load_late_rules()
+    before_cutoff = {household.id: months for household, _, months, _ in defaulters(rules, today=D(2025, 4, 10))}
+    after_cutoff = {household.id: months for household, _, months, _ in defaulters(rules, today=D(2025, 4, 22))}
+    for household in society:
+        assert after_cutoff[household.id] == before_cutoff.get(household.id, 0) + 1 # April only counts once day 21 has passed
@@ -0,0 +1,9 @@
+# views/__init__.py
+# Blueprints registered by create_app() in app.py
+
+from views.households import bp as households_bp
+from views.payments import bp as payments_bp
+from views.imports import bp as imports_bp
+from views.ocr import bp as ocr_bp
+
+BLUEPRINTS = (households_bp, payments_bp, imports_bp, ocr_bp)
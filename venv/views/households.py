@@ -0,0 +1,109 @@
+# views/households.py
+# Household blueprint: add, edit and delete flats
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from models import db, Household
+
+bp = Blueprint('households', __name__)
+
+
+@bp.route('/add_household', methods=['GET', 'POST'])
+def add_household():
+    """Handles adding a new household."""
+    if request.method == 'POST':
+        flat_number = request.form.get('flat_number','').strip().upper()
+        wing = request.form.get('wing','').strip().upper() or None # Store empty wing as None
+        owner_renter_name = request.form.get('owner_renter_name','').strip()
+
+        if not flat_number or not owner_renter_name:
+            flash('Flat Number and Owner/Renter Name are required.', 'warning')
+            return render_template('household_form.html', title="Add Household", form_data=request.form)
+
+        # Check if household already exists
+        existing = Household.query.filter_by(flat_number=flat_number, wing=wing).first()
+        if existing:
+             flash(f'Household {wing+"-" if wing else ""}{flat_number} already exists.', 'warning')
+             return render_template('household_form.html', title="Add Household", form_data=request.form)
+
+        try:
+            new_household = Household(
+                flat_number=flat_number,
+                wing=wing,
+                owner_renter_name=owner_renter_name
+            )
+            db.session.add(new_household)
+            db.session.commit()
+            flash(f'Household {wing+"-" if wing else ""}{flat_number} added successfully!', 'success')
+            return redirect(url_for('payments.index'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error adding household: {e}', 'error')
+            return render_template('household_form.html', title="Add Household", form_data=request.form)
+
+    return render_template('household_form.html', title="Add Household")
+
+
+@bp.route('/edit_household/<int:id>', methods=['GET', 'POST'])
+def edit_household(id):
+    """Handles editing an existing household."""
+    household = Household.query.get_or_404(id)
+
+    if request.method == 'POST':
+        new_flat_number = request.form.get('flat_number','').strip().upper()
+        new_wing = request.form.get('wing','').strip().upper() or None
+        new_owner_renter_name = request.form.get('owner_renter_name','').strip()
+
+        if not new_flat_number or not new_owner_renter_name:
+            flash('Flat Number and Owner/Renter Name are required.', 'warning')
+            # Pass current (unsaved) data back to form
+            household.flat_number = new_flat_number
+            household.wing = new_wing
+            household.owner_renter_name = new_owner_renter_name
+            return render_template('household_form.html', title="Edit Household", household=household)
+
+        # Check for conflicts
+        existing = Household.query.filter(
+            Household.flat_number == new_flat_number,
+            Household.wing == new_wing,
+            Household.id != id
+        ).first()
+        if existing:
+            flash(f'Another household with Flat {new_wing+"-" if new_wing else ""}{new_flat_number} already exists.', 'warning')
+            household.flat_number = new_flat_number
+            household.wing = new_wing
+            household.owner_renter_name = new_owner_renter_name
+            return render_template('household_form.html', title="Edit Household", household=household)
+
+        try:
+            household.flat_number = new_flat_number
+            household.wing = new_wing
+            household.owner_renter_name = new_owner_renter_name
+            db.session.commit()
+            flash(f'Household {household.wing+"-" if household.wing else ""}{household.flat_number} updated successfully!', 'success')
+            return redirect(url_for('payments.index'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error updating household: {e}', 'error')
+            # Pass current (unsaved) data back to form
+            household.flat_number = new_flat_number
+            household.wing = new_wing
+            household.owner_renter_name = new_owner_renter_name
+            return render_template('household_form.html', title="Edit Household", household=household)
+
+    # GET request
+    return render_template('household_form.html', title="Edit Household", household=household)
+
+
+@bp.route('/delete_household/<int:id>', methods=['POST'])
+def delete_household(id):
+    """Handles deleting a household."""
+    household = Household.query.get_or_404(id)
+    hh_identifier = f'{household.wing+"-" if household.wing else ""}{household.flat_number}'
+    try:
+        db.session.delete(household)
+        db.session.commit()
+        flash(f'Household {hh_identifier} and associated payments deleted.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error deleting household: {e}', 'error')
+    return redirect(url_for('payments.index'))
@@ -0,0 +1,207 @@
+# views/imports.py
+# Imports blueprint: WhatsApp chat (.txt) and media ZIP uploads, receipt batch review, bulk CSV/XLSX import and CSV export
+
+import io
+import datetime
+import calendar
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from werkzeug.utils import secure_filename # For secure file uploads
+from models import db, Household
+from helpers import allowed_file, ALLOWED_EXTENSIONS_CHAT, ALLOWED_EXTENSIONS_ZIP, ALLOWED_EXTENSIONS_BULK
+from chat_import import import_chat, apply_receipt_batch
+from bulk_io import read_rows, import_rows, iter_payments_csv, parse_period
+from late_rules import load_late_rules
+
+MAX_REPORTED_RECEIPTS = 20 # Number of matched flats listed in the chat import summary
+
+bp = Blueprint('imports', __name__)
+
+
+@bp.route('/upload_chat', methods=['GET', 'POST'])
+def upload_chat():
+    """Handles uploading and parsing WhatsApp chat export file."""
+    if request.method == 'POST':
+        # Check if the post request has the file part
+        if 'chatfile' not in request.files:
+            flash('No file part', 'error')
+            return redirect(request.url)
+        file = request.files['chatfile']
+        # If the user does not select a file, the browser submits an empty file without a filename.
+        if file.filename == '':
+            flash('No selected file', 'warning')
+            return redirect(request.url)
+
+        if file and allowed_file(file.filename, ALLOWED_EXTENSIONS_CHAT):
+            filename = secure_filename(file.filename)
+            try:
+                # Stream the upload straight into the parser instead of saving it to disk first
+                lines = io.TextIOWrapper(file.stream, encoding='utf-8', errors='replace')
+                result = import_chat(lines)
+
+                # Report results
+                flash(f"Processed {result.lines_processed} lines from '{filename}'.", 'info')
+                if result.skipped_count:
+                    flash(f"Skipped {result.skipped_count} attachment messages already imported earlier.", 'info')
+                if result.found_receipts:
+                    # Use set to show unique households found
+                    unique_found = sorted(set(result.found_receipts))
+                    shown = ", ".join(unique_found[:MAX_REPORTED_RECEIPTS])
+                    if len(unique_found) > MAX_REPORTED_RECEIPTS:
+                        shown += f" and {len(unique_found) - MAX_REPORTED_RECEIPTS} more"
+                    flash(f"Potential receipts found for: {shown}. {result.updated_count} payment records marked 'Receipt Found' - please verify and update payment details manually.", 'success')
+                else:
+                     flash("No new potential receipts identified based on current parsing rules and attachment indicators.", 'info')
+                if result.errors:
+                    flash("Parsing Issues Encountered (Max 5 shown): " + "; ".join(result.errors[:5]), 'error') # Show first few errors
+
+                return redirect(url_for('payments.index'))
+
+            except Exception as e:
+                db.session.rollback()
+                flash(f"An error occurred processing file '{filename}': {e}", 'error')
+                return redirect(request.url)
+        else:
+            flash('Invalid file type. Please upload a .txt file.', 'error')
+            return redirect(request.url)
+
+    # GET request: show the upload form
+    return render_template('chat_upload_form.html')
+
+
+@bp.route('/upload_chat_zip', methods=['POST'])
+def upload_chat_zip():
+    """Handles uploading a WhatsApp 'export with media' ZIP; queues OCR of the receipt images and redirects to the review page (which polls for the proposals)."""
+    if 'chatzip' not in request.files:
+        flash('No file part', 'error')
+        return redirect(url_for('imports.upload_chat'))
+    file = request.files['chatzip']
+    if file.filename == '':
+        flash('No selected file', 'warning')
+        return redirect(url_for('imports.upload_chat'))
+    if not allowed_file(file.filename, ALLOWED_EXTENSIONS_ZIP):
+        flash('Invalid file type. Please upload a .zip file.', 'error')
+        return redirect(url_for('imports.upload_chat'))
+
+    filename = secure_filename(file.filename)
+    try:
+        # Only the upload is saved here; matching and OCR run on a background job
+        batch_id = current_app.extensions['receipt_batches'].start(current_app._get_current_object(), file.stream, filename)
+    except Exception as e:
+        flash(f"An error occurred processing file '{filename}': {e}", 'error')
+        return redirect(url_for('imports.upload_chat'))
+    return redirect(url_for('imports.receipt_batch', batch_id=batch_id))
+
+
+@bp.route('/receipt_batch/<batch_id>')
+def receipt_batch(batch_id):
+    """Shows the proposed updates of a receipt batch for review (a progress note that polls until OCR finishes)."""
+    batch = current_app.extensions['receipt_batches'].status(batch_id)
+    if batch['status'] == 'unknown':
+        flash('Receipt batch not found. Please upload the ZIP again.', 'error')
+        return redirect(url_for('imports.upload_chat'))
+    if batch['status'] == 'error':
+        flash(f"An error occurred processing file '{batch.get('filename', 'ZIP')}': {batch['error']}", 'error')
+        return redirect(url_for('imports.upload_chat'))
+    return render_template(
+        'receipt_batch_review.html',
+        batch_id=batch_id,
+        batch=batch,
+        month_map={m: calendar.month_name[m] for m in range(1, 13)}
+    )
+
+
+@bp.route('/receipt_batch_status/<batch_id>')
+def receipt_batch_status(batch_id):
+    """Returns the status of a receipt batch as JSON (polled by the review page)."""
+    status = current_app.extensions['receipt_batches'].status(batch_id)['status']
+    return jsonify({'status': status}), (404 if status == 'unknown' else 200)
+
+
+@bp.route('/apply_receipt_batch', methods=['POST'])
+def apply_receipt_batch_route():
+    """Applies the receipt proposals selected on the review page to payment records."""
+    rows = []
+    try:
+        late_rules = load_late_rules()
+        selected = request.form.getlist('selected', type=int)
+        household_ids = {request.form.get(f'household_id-{index}', type=int) for index in selected}
+        wings = dict(db.session.execute(db.select(Household.id, Household.wing).where(Household.id.in_(household_ids))).all())
+        for index in selected:
+            payment_date_str = request.form.get(f'payment_date-{index}')
+            payment_date = datetime.datetime.strptime(payment_date_str, '%Y-%m-%d').date() if payment_date_str else None
+            month = request.form.get(f'month-{index}', type=int)
+            year = request.form.get(f'year-{index}', type=int)
+            household_id = request.form.get(f'household_id-{index}', type=int)
+            rows.append({
+                'household_id': household_id,
+                'month': month,
+                'year': year,
+                'amount': request.form.get(f'amount-{index}', type=float),
+                'receipt_id': request.form.get(f'receipt_id-{index}') or None,
+                'payment_date': payment_date,
+                'is_late': late_rules.is_late(payment_date, month, year, wings.get(household_id))
+            })
+        updated = apply_receipt_batch(rows)
+        current_app.extensions['receipt_batches'].discard(request.form.get('batch_id'))
+        flash(f"Applied {updated} receipts to payment records.", 'success')
+    except ValueError:
+        flash('Invalid Payment Date format in batch. Please use YYYY-MM-DD.', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error applying receipt batch: {e}", 'error')
+    return redirect(url_for('payments.index'))
+
+
+@bp.route('/import_data', methods=['GET', 'POST'])
+def import_data():
+    """Handles bulk upload of households and historical payments from a CSV/XLSX file."""
+    if request.method == 'POST':
+        if 'datafile' not in request.files:
+            flash('No file part', 'error')
+            return redirect(request.url)
+        file = request.files['datafile']
+        if file.filename == '':
+            flash('No selected file', 'warning')
+            return redirect(request.url)
+        if not allowed_file(file.filename, ALLOWED_EXTENSIONS_BULK):
+            flash('Invalid file type. Please upload a .csv or .xlsx file.', 'error')
+            return redirect(request.url)
+
+        filename = secure_filename(file.filename)
+        try:
+            result = import_rows(read_rows(file.stream, filename), load_late_rules().is_late)
+        except Exception as e:
+            db.session.rollback()
+            flash(f"An error occurred importing file '{filename}': {e}", 'error')
+            return redirect(request.url)
+
+        if result.errors:
+            flash(f"No changes saved - {len(result.errors)} problems found in '{filename}' (Max 5 shown): " + "; ".join(result.errors[:5]), 'error')
+            return render_template('bulk_import_form.html', import_errors=result.errors)
+        flash(
+            f"Imported {result.rows_read} rows from '{filename}': {result.households_created} households added, "
+            f"{result.households_updated} updated; {result.payments_created} payment records added, {result.payments_updated} updated.",
+            'success'
+        )
+        return redirect(url_for('payments.index'))
+
+    return render_template('bulk_import_form.html')
+
+
+@bp.route('/export_payments')
+def export_payments():
+    """Streams payment records for a month range (?start=YYYY-MM&end=YYYY-MM) as a CSV download."""
+    today = datetime.date.today()
+    try:
+        start = parse_period(request.args.get('start', f"{today.year}-01"))
+        end = parse_period(request.args.get('end', f"{today.year}-{today.month:02d}"))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('imports.import_data'))
+    filename = f"payments_{start[0]}-{start[1]:02d}_{end[0]}-{end[1]:02d}.csv"
+    # Rows are written out as they are fetched, so the response never holds the whole export
+    return Response(
+        stream_with_context(iter_payments_csv(start, end)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
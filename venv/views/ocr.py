@@ -0,0 +1,54 @@
+# views/ocr.py
+# OCR blueprint: receipt image upload for assisted payment entry and job status polling
+# The OcrJobQueue is created by create_app() and kept in app.extensions['ocr_queue']
+
+from flask import Blueprint, current_app, request, redirect, url_for, flash, jsonify
+from models import Household
+from helpers import allowed_file, ALLOWED_EXTENSIONS_IMG
+
+bp = Blueprint('ocr', __name__)
+
+
+@bp.route('/upload_receipt/<int:household_id>/<int:year>/<int:month>', methods=['POST'])
+def upload_receipt(household_id, year, month):
+    """Handles uploading a receipt image, queues OCR and redirects to the payment form (which polls for the result)."""
+    household = Household.query.get_or_404(household_id)
+    hh_identifier = f'{household.wing+"-" if household.wing else ""}{household.flat_number}'
+
+    if 'receipt_image' not in request.files:
+        flash('No file part', 'error')
+        return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month))
+    file = request.files['receipt_image']
+    if file.filename == '':
+        flash('No selected file', 'warning')
+        return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month))
+
+    if file and allowed_file(file.filename, ALLOWED_EXTENSIONS_IMG):
+        try:
+            # The image is kept in memory and handed to the OCR worker pool - nothing is written to the upload folder
+            job_id, cached = current_app.extensions['ocr_queue'].submit(file.read())
+        except Exception as e:
+            flash(f"Error saving or processing image for {hh_identifier}: {e}", 'error')
+            return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month))
+
+        if cached is None:
+            flash(f"Receipt image for {hh_identifier} queued for OCR. Details will be pre-filled when processing finishes.", "info")
+            return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month, ocr_job=job_id))
+
+        # Same image was processed before - use the cached result straight away
+        for warning in cached.get('warnings', []):
+            flash(warning, "warning")
+        flash(f"OCR processed image for {hh_identifier}. Please verify pre-filled details.", "info")
+        # --- Redirect to the payment form with extracted data as query parameters ---
+        query_params = {f'ocr_{k}': cached.get(k) for k in ('amount', 'receipt_id', 'date') if cached.get(k) is not None}
+        return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month, **query_params))
+    else:
+        flash('Invalid file type. Allowed image types: png, jpg, jpeg, gif, bmp, webp', 'error')
+        return redirect(url_for('payments.record_payment', household_id=household_id, year=year, month=month))
+
+
+@bp.route('/ocr_status/<job_id>')
+def ocr_status(job_id):
+    """Returns the status of a queued OCR job as JSON (polled by the payment form)."""
+    status = current_app.extensions['ocr_queue'].status(job_id)
+    return jsonify(status), (404 if status['status'] == 'unknown' else 200)
@@ -0,0 +1,263 @@
+# views/payments.py
+# Payments blueprint: monthly dashboard, payment matrix, reports, payment entry and late-payment rules
+
+import datetime
+import calendar
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from models import db, Household, LatePaymentRule, Holiday
+from helpers import get_or_create_payment_record, is_payment_late, ensure_payment_records, month_periods, load_payment_grid
+from late_rules import LATE_PAYMENT_DAY, LATE_MODES, LATE_MODE_CUTOFF_DAY, load_late_rules, set_late_rule, recompute_late_flags
+from rollups import collection_by_month, defaulters
+
+# --- Constants ---
+MATRIX_DEFAULT_MONTHS = 6 # Number of months shown in the payment matrix by default
+MATRIX_MAX_MONTHS = 36 # Upper bound on the payment matrix width
+ARREARS_DEFAULT_MONTHS = 12 # Months covered by the arrears report by default
+ARREARS_MAX_MONTHS = 120 # Upper bound on the arrears report window
+
+bp = Blueprint('payments', __name__)
+
+
+@bp.route('/')
+def index():
+    """Main dashboard page. Displays households and their payment status for the selected month."""
+    try:
+        today = datetime.date.today()
+        current_month = request.args.get('month', default=today.month, type=int)
+        current_year = request.args.get('year', default=today.year, type=int)
+
+        # Create any missing pending payment records in one statement
+        if ensure_payment_records(current_month, current_year):
+            db.session.commit()
+
+        # Load households and their payments for the month in a single joined query
+        household_payments = [
+            {'household': hh, 'payment': payments.get((current_year, current_month))}
+            for hh, payments in load_payment_grid([(current_year, current_month)])
+        ]
+
+        months = list(range(1, 13))
+        years = list(range(today.year - 2, today.year + 2))
+        month_map = {m: calendar.month_name[m] for m in months}
+
+        return render_template(
+            'index.html',
+            household_payments=household_payments,
+            current_month=current_month,
+            current_year=current_year,
+            months=months,
+            years=years,
+            month_map=month_map
+        )
+    except Exception as e:
+        db.session.rollback()
+        flash(f"An error occurred loading dashboard: {e}", "error")
+        month_map = {m: calendar.month_name[m] for m in range(1, 13)}
+        return render_template('index.html', household_payments=[], current_month=today.month, current_year=today.year, months=[], years=[], month_map=month_map)
+
+
+@bp.route('/matrix')
+def payment_matrix():
+    """Displays a households x months status grid for the N months ending at the selected month."""
+    today = datetime.date.today()
+    end_month = request.args.get('month', default=today.month, type=int)
+    end_year = request.args.get('year', default=today.year, type=int)
+    span = request.args.get('span', default=MATRIX_DEFAULT_MONTHS, type=int)
+    span = max(1, min(span, MATRIX_MAX_MONTHS)) # Keep the grid to a sensible size
+
+    months = list(range(1, 13))
+    years = list(range(today.year - 2, today.year + 2))
+    month_map = {m: calendar.month_name[m] for m in months}
+    try:
+        periods = month_periods(end_month, end_year, span)
+        grid = load_payment_grid(periods) # Read-only: missing records are shown as empty cells
+    except Exception as e:
+        db.session.rollback()
+        flash(f"An error occurred loading payment matrix: {e}", "error")
+        periods, grid = [], []
+
+    return render_template(
+        'payment_matrix.html',
+        grid=grid,
+        periods=periods,
+        current_month=end_month,
+        current_year=end_year,
+        span=span,
+        months=months,
+        years=years,
+        month_map=month_map
+    )
+
+
+@bp.route('/reports/arrears')
+def arrears_report():
+    """Collection summary (expected vs paid, status counts) per month and per wing, read from the monthly rollup table."""
+    today = datetime.date.today()
+    end_month = request.args.get('month', default=today.month, type=int)
+    end_year = request.args.get('year', default=today.year, type=int)
+    span = request.args.get('months', default=ARREARS_DEFAULT_MONTHS, type=int)
+    span = max(1, min(span, ARREARS_MAX_MONTHS))
+
+    months = list(range(1, 13))
+    years = list(range(today.year - 2, today.year + 2))
+    month_map = {m: calendar.month_name[m] for m in months}
+    try:
+        month_rows, wing_rows = collection_by_month(month_periods(end_month, end_year, span))
+    except Exception as e:
+        db.session.rollback()
+        flash(f"An error occurred loading arrears report: {e}", "error")
+        month_rows, wing_rows = [], []
+
+    return render_template(
+        'arrears_report.html',
+        month_rows=month_rows,
+        wing_rows=wing_rows,
+        current_month=end_month,
+        current_year=end_year,
+        span=span,
+        months=months,
+        years=years,
+        month_map=month_map
+    )
+
+
+@bp.route('/reports/defaulters')
+def defaulters_report():
+    """Lists households with unpaid months past their payment deadline, worst first, read from the per-household balance table."""
+    min_months = max(1, request.args.get('min_months', default=1, type=int))
+    try:
+        rows = defaulters(load_late_rules(), min_months)
+    except Exception as e:
+        db.session.rollback()
+        flash(f"An error occurred loading defaulters report: {e}", "error")
+        rows = []
+    return render_template('defaulters_report.html', rows=rows, min_months=min_months)
+
+
+@bp.route('/record_payment/<int:household_id>/<int:year>/<int:month>', methods=['GET', 'POST'])
+def record_payment(household_id, year, month):
+    """Handles recording or updating a payment for a specific household and month."""
+    household = Household.query.get_or_404(household_id)
+    payment = get_or_create_payment_record(household_id, month, year)
+    hh_identifier = f'{household.wing+"-" if household.wing else ""}{household.flat_number}'
+
+    # Commit if the record was just created by get_or_create...
+    if payment in db.session.new:
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error preparing payment record for {hh_identifier}: {e}", "error")
+            return redirect(url_for('payments.index', month=month, year=year))
+
+    if request.method == 'POST':
+        try:
+            payment.amount_paid = request.form.get('amount_paid', type=float) # Returns None if empty or invalid
+            payment_date_str = request.form.get('payment_date')
+            payment.status = request.form.get('status', 'Pending')
+            payment.receipt_id = request.form.get('receipt_id')
+            payment.notes = request.form.get('notes')
+
+            # --- Late Payment Logic ---
+            payment.is_late = False # Reset late status by default
+            if payment_date_str:
+                try:
+                    payment.payment_date = datetime.datetime.strptime(payment_date_str, '%Y-%m-%d').date()
+                    payment.is_late = is_payment_late(payment.payment_date, month, year, household.wing)
+                except ValueError:
+                    flash('Invalid Payment Date format. Please use YYYY-MM-DD.', 'error')
+                    # Don't proceed with saving if date is invalid
+                    month_name = calendar.month_name[month]
+                    return render_template('payment_form.html', title="Record Payment", household=household, payment=payment, year=year, month=month, month_name=month_name)
+            else:
+                 payment.payment_date = None # Clear date if field is empty
+
+            db.session.commit()
+            flash(f'Payment for {hh_identifier} ({year}-{month:02d}) updated.', 'success')
+            return redirect(url_for('payments.index', month=month, year=year))
+
+        except ValueError:
+             flash('Invalid Amount Paid. Please enter a number.', 'error')
+             db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error updating payment for {hh_identifier}: {e}', 'error')
+
+    # GET request or if POST fails validation
+    month_name = calendar.month_name[month]
+    # Check if OCR data was passed via query parameters (simple way for GET redirect)
+    # A more robust way might use session flashing
+    ocr_data_from_query = {
+        'amount': request.args.get('ocr_amount'),
+        'receipt_id': request.args.get('ocr_receipt_id'),
+        'date': request.args.get('ocr_date')
+    }
+    ocr_job_id = request.args.get('ocr_job') # Set when OCR is still running in the background
+
+    return render_template(
+        'payment_form.html',
+        title="Record Payment",
+        household=household,
+        payment=payment,
+        year=year,
+        month=month,
+        month_name=month_name,
+        ocr_data=ocr_data_from_query, # Pass potential OCR data to template
+        ocr_job_id=ocr_job_id
+     )
+
+
+@bp.route('/late_rules', methods=['GET', 'POST'])
+def late_rules():
+    """Manages the late-payment rules and holidays; every change re-flags all payment history."""
+    if request.method == 'POST':
+        action = request.form.get('action')
+        try:
+            if action == 'save_rule':
+                cutoff_day = request.form.get('cutoff_day', type=int)
+                if cutoff_day is None:
+                    raise ValueError("Cut-off day is required.")
+                rule = set_late_rule(
+                    request.form.get('wing'),
+                    cutoff_day,
+                    request.form.get('grace_days', default=0, type=int) or 0,
+                    bool(request.form.get('holiday_shift')),
+                    request.form.get('late_mode') or LATE_MODE_CUTOFF_DAY
+                )
+                message = f"Late-payment rule for {'Wing ' + rule.wing if rule.wing else 'the whole society'} saved."
+            elif action == 'delete_rule':
+                rule = db.get_or_404(LatePaymentRule, request.form.get('rule_id', type=int))
+                db.session.delete(rule)
+                message = f"Late-payment rule for {'Wing ' + rule.wing if rule.wing else 'the whole society'} removed."
+            elif action == 'add_holiday':
+                try:
+                    holiday_date = datetime.datetime.strptime(request.form.get('holiday_date', ''), '%Y-%m-%d').date()
+                except ValueError:
+                    raise ValueError("Invalid holiday date. Please use YYYY-MM-DD.")
+                if db.session.scalars(db.select(Holiday).where(Holiday.holiday_date == holiday_date)).first():
+                    raise ValueError(f"{holiday_date} is already listed as a holiday.")
+                db.session.add(Holiday(holiday_date=holiday_date, description=request.form.get('description', '').strip() or None))
+                message = f"Holiday {holiday_date} added."
+            elif action == 'delete_holiday':
+                holiday = db.get_or_404(Holiday, request.form.get('holiday_id', type=int))
+                db.session.delete(holiday)
+                message = f"Holiday {holiday.holiday_date} removed."
+            else:
+                flash('Unknown action.', 'error')
+                return redirect(url_for('payments.late_rules'))
+            db.session.flush()
+            # Rules changed: bring every stored late flag in line with them in the same transaction
+            changed = recompute_late_flags()
+            db.session.commit()
+            flash(f"{message} Late flags recomputed: {changed} payment records changed.", 'success')
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error updating late-payment rules: {e}", 'error')
+        return redirect(url_for('payments.late_rules'))
+
+    rules = db.session.scalars(db.select(LatePaymentRule).order_by(LatePaymentRule.wing.is_not(None), LatePaymentRule.wing)).all()
+    holidays = db.session.scalars(db.select(Holiday).order_by(Holiday.holiday_date)).all()
+    return render_template('late_rules.html', rules=rules, holidays=holidays, default_cutoff_day=LATE_PAYMENT_DAY, late_modes=LATE_MODES)
@@ -0,0 +1,15 @@
+# wsgi.py
+# WSGI entry point for multi-worker deployments, e.g.:
+#   gunicorn --preload -w 4 wsgi:app
+# With --preload the app is created once in the master process and the workers are forked from it,
+# so the imported modules and compiled templates are shared copy-on-write instead of loaded per worker
+
+import gc
+from app import create_app
+
+app = create_app()
+
+# Move everything allocated so far out of the garbage collector's view: collections in the workers
+# would otherwise touch (and so copy) the shared pages. create_app() opens no database connections
+# and starts no OCR processes, so nothing that must not be shared across a fork exists yet.
+gc.freeze()